@@ -3,13 +3,15 @@ from flask_bootstrap import Bootstrap
 from flask_login import LoginManager
 from flask_mail import Mail
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 
+from app import replicas
+from app.replicas import RoutingSQLAlchemy
 from config import config
+from core.ttl_cache import TTLCache
 
 bootstrap = Bootstrap()
 moment = Moment()
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 mail = Mail()
 
 login_manager = LoginManager()
@@ -26,8 +28,30 @@ def create_app(config_name: str) -> Flask:
     bootstrap.init_app(app)
     moment.init_app(app)
     db.init_app(app)
+    replicas.init_app(app)
     mail.init_app(app)
     login_manager.init_app(app)
+    app.extensions["token_cache"] = TTLCache(
+        app.config["LASTWEEK_TOKEN_CACHE_SIZE"],
+        app.config["LASTWEEK_TOKEN_CACHE_TTL"],
+    )
+    app.extensions["credential_cache"] = TTLCache(
+        app.config["LASTWEEK_CREDENTIAL_CACHE_SIZE"],
+        app.config["LASTWEEK_CREDENTIAL_CACHE_TTL"],
+    )
+    app.extensions["tag_cache"] = TTLCache(
+        app.config["LASTWEEK_TAG_CACHE_SIZE"],
+        app.config["LASTWEEK_TAG_CACHE_TTL"],
+    )
+
+    from app import instrumentation, metrics
+    from app.email import EmailTemplates, MailQueue
+
+    app.extensions["mail_queue"] = MailQueue(app)
+    app.extensions["email_templates"] = EmailTemplates(app)
+
+    instrumentation.init_app(app)
+    metrics.init_app(app)
 
     from app.main import main as main_blueprint
     from app.auth import auth as auth_blueprint
@@ -7,5 +7,10 @@ from . import authentication, errors, routes
 # routes:
 # /user (GET) return user metadata
 # /weeks/ (GET) get all user snippets
+# /weeks/ (POST) set many user weeks at once
 # /weeks/current (GET) get current week
-# /weeks/<year>/<week> (GET, POST) get/set specific user week
\ No newline at end of file
+# /weeks/<year>/<week> (GET, POST) get/set specific user week
+# /export (GET) stream all user snippets as NDJSON
+# /search?q= (GET) search user snippets, best matches first
+# /tags (GET) get user tags with snippet counts, most used first
+# /tags/complete?prefix= (GET) get most used user tags with a prefix
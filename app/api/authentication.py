@@ -36,4 +36,4 @@ def verify_password(email_or_token: str, password: str) -> bool:
         return False
     g.current_user = user
     g.token_used = False
-    return user.verify_password(password)
\ No newline at end of file
+    return user.verify_password_cached(password)
\ No newline at end of file
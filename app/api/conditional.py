@@ -0,0 +1,44 @@
+from datetime import datetime
+from typing import Optional, Set
+
+from flask.globals import request
+from werkzeug.wrappers import Response
+
+
+def is_fresh(etag: str, last_modified: Optional[datetime]) -> bool:
+    """Returns whether the client already has the current representation.
+
+    If-None-Match takes precedence over If-Modified-Since.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        since = request.if_modified_since.replace(tzinfo=None)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def not_modified(etag: str, last_modified: Optional[datetime]) -> Response:
+    response = Response(status=304)
+    return with_validators(response, etag, last_modified)
+
+
+def with_validators(
+    response: Response, etag: str, last_modified: Optional[datetime]
+) -> Response:
+    """Sets the ETag and Last-Modified headers of a response."""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+
+def expected_versions() -> Optional[Set[int]]:
+    """Returns the snippet versions listed in an If-Match header, if any.
+
+    A missing header or a * matches every version, so returns None. Tags
+    that aren't snippet versions can never match and are ignored.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    return {int(etag) for etag in request.if_match.as_set() if etag.isdigit()}
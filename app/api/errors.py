@@ -2,6 +2,7 @@ from flask import jsonify
 from werkzeug.wrappers import Response
 
 from . import api
+from app.models import VersionConflict
 
 
 class ValidationError(ValueError):
@@ -26,6 +27,20 @@ def bad_request(message: str = None) -> Response:
     return response
 
 
+def precondition_failed(message: str = None) -> Response:
+    json = {"error": "precondition failed"}
+    if message:
+        json["message"] = message
+    response = jsonify(json)
+    response.status_code = 412
+    return response
+
+
 @api.errorhandler(ValidationError)
 def validation_error(e):
-    return bad_request(e.args[0])
\ No newline at end of file
+    return bad_request(e.args[0])
+
+
+@api.errorhandler(VersionConflict)
+def version_conflict(e):
+    return precondition_failed(e.args[0])
@@ -1,12 +1,27 @@
 from flask.helpers import url_for
 from app.api.errors import ValidationError, unauthorized
-from flask import jsonify
+from flask import jsonify, stream_with_context
 from flask.globals import current_app, g, request
+from sqlalchemy.orm.query import Query
+from json import dumps
+from typing import Iterator, Optional
+import zlib
+from werkzeug.wrappers import Response
 
 from . import api
+from .conditional import (
+    expected_versions,
+    is_fresh,
+    not_modified,
+    with_validators,
+)
 from .decorators import validate_week
-from app.models import Snippet
-from core.date_utils import is_valid_iso_week, this_week
+from app.models import Snippet, TagCount
+from app.search import highlight_html, search
+from core.date_utils import is_valid_iso_week, parse_iso_week, this_week
+
+# the most tags /tags/complete returns
+MAX_TAG_COMPLETIONS = 50
 
 
 @api.route("/login", methods=["POST"])
@@ -24,9 +39,15 @@ def get_user():
 
 @api.route("/weeks/")
 def get_weeks():
+    (etag, last_modified) = Snippet.get_state(g.current_user.id)
+    if is_fresh(etag, last_modified):
+        return not_modified(etag, last_modified)
     page = request.args.get("page", 1, type=int)
     tag = request.args.get("tag")
     snippets = Snippet.get_all(g.current_user.id, tag_text=tag)
+    if "cursor" in request.args:
+        response = get_weeks_by_cursor(snippets, tag)
+        return with_validators(response, etag, last_modified)
 
     pagination = snippets.paginate(
         page,
@@ -41,9 +62,113 @@ def get_weeks():
     if pagination.has_next:
         next = url_for("api.get_weeks", page=page + 1)
 
+    response = jsonify(
+        {
+            "weeks": Snippet.to_json_all(snippets),
+            "prev_url": prev,
+            "next_url": next,
+            "count": pagination.total,
+        }
+    )
+    return with_validators(response, etag, last_modified)
+
+
+@api.route("/weeks/", methods=["PUT", "POST"])
+def update_weeks():
+    """Writes a list of weeks in one transaction.
+
+    Returns a result for each week in the order given. Invalid weeks are
+    reported and skipped without affecting the others.
+    """
+    weeks = request.json
+    if not isinstance(weeks, list):
+        raise ValidationError("expected a list of weeks")
+    if len(weeks) > current_app.config["LASTWEEK_MAX_BATCH_WEEKS"]:
+        raise ValidationError("too many weeks")
+    results = []
+    valid = []
+    for week in weeks:
+        if (error := Snippet.validate_json(week)) is not None:
+            result = {"success": False, "message": error}
+        else:
+            valid.append(week)
+            url = url_for("api.get_week", year=week["year"], week=week["week"])
+            result = {"success": True, "url": url}
+        if isinstance(week, dict):
+            result.update(year=week.get("year"), week=week.get("week"))
+        results.append(result)
+    Snippet.load_all_from_json(g.current_user.id, valid)
+    return jsonify({"weeks": results})
+
+
+@api.route("/export")
+def export_weeks():
+    """Streams all of the user's snippets as newline-delimited JSON.
+
+    An ISO week date like 2021-W16 can be given as since to skip earlier
+    weeks. The stream is gzipped if the client accepts it.
+    """
+    since = request.args.get("since")
+    if since:
+        try:
+            since = parse_iso_week(since)
+        except ValueError as e:
+            raise ValidationError(e.args[0])
+    lines = (
+        dumps(snippet) + "\n"
+        for snippet in Snippet.export(g.current_user.id, since or None)
+    )
+    response = current_app.response_class(mimetype="application/x-ndjson")
+    if request.accept_encodings["gzip"]:
+        lines = gzip_stream(lines)
+        response.content_encoding = "gzip"
+    response.vary.add("Accept-Encoding")
+    response.response = stream_with_context(lines)
+    return response
+
+
+def gzip_stream(lines: Iterator[str]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for line in lines:
+        if chunk := compressor.compress(line.encode("utf-8")):
+            yield chunk
+    yield compressor.flush()
+
+
+@api.route("/search")
+def search_weeks():
+    """Returns the weeks matching a full-text search, best first.
+
+    Each week's highlight is an HTML fragment of its text with the matching
+    words in <mark> tags.
+    """
+    text = request.args.get("q", "")
+    results = search(g.current_user.id, text)
+    if results is None:
+        raise ValidationError("search has no words")
+    page = request.args.get("page", 1, type=int)
+    pagination = results.paginate(
+        page,
+        per_page=current_app.config["LASTWEEK_SNIPPETS_PER_PAGE"],
+        error_out=True,
+    )
+    prev = None
+    if pagination.has_prev:
+        prev = url_for("api.search_weeks", q=text, page=page - 1)
+    next = None
+    if pagination.has_next:
+        next = url_for("api.search_weeks", q=text, page=page + 1)
+    snippets = [snippet for (snippet, _, _) in pagination.items]
+    tags = Snippet.get_tags(snippets)
+    weeks = []
+    for (snippet, rank, highlight) in pagination.items:
+        week = snippet.to_json(tags[snippet.id])
+        week["rank"] = rank
+        week["highlight"] = highlight_html(highlight)
+        weeks.append(week)
     return jsonify(
         {
-            "weeks": [snippet.to_json() for snippet in snippets],
+            "weeks": weeks,
             "prev_url": prev,
             "next_url": next,
             "count": pagination.total,
@@ -51,6 +176,34 @@ def get_weeks():
     )
 
 
+@api.route("/tags")
+def get_tags():
+    """Returns the user's tags and how many snippets use each, most first."""
+    tags = TagCount.get_all(g.current_user.id)
+    return jsonify(
+        {"tags": [{"text": text, "count": count} for (text, count) in tags]}
+    )
+
+
+@api.route("/tags/complete")
+def complete_tags():
+    """Returns the user's most used tags starting with ?prefix=."""
+    return tag_completions(g.current_user.id)
+
+
+def tag_completions(user_id: int) -> Response:
+    prefix = request.args.get("prefix", "")
+    limit = request.args.get("limit", 10, type=int)
+    if not 0 < limit <= MAX_TAG_COMPLETIONS:
+        raise ValidationError(
+            f"limit must be between 1 and {MAX_TAG_COMPLETIONS}"
+        )
+    tags = TagCount.complete(user_id, prefix.strip(), limit)
+    return jsonify(
+        {"tags": [{"text": text, "count": count} for (text, count) in tags]}
+    )
+
+
 @api.route("/weeks/current")
 @api.route("/weeks/<int:year>/<int:week>")
 @validate_week
@@ -61,7 +214,10 @@ def get_week(year=None, week=None):
     if snippet is None:
         # don't worry about actually adding to the database until user saves
         snippet = Snippet(user_id=g.current_user.id, year=year, week=week)
-    return jsonify(snippet.to_json())
+    if is_fresh(snippet.etag, snippet.updated_at):
+        return not_modified(snippet.etag, snippet.updated_at)
+    response = jsonify(snippet.to_json())
+    return with_validators(response, snippet.etag, snippet.updated_at)
 
 
 @api.route("/weeks/current", methods=["PUT", "POST"])
@@ -72,5 +228,40 @@ def update_week(year=None, week=None):
         (year, week) = this_week()
     text = request.json.get("text", "")
     tags = request.json.get("tags", [])
-    Snippet.update(g.current_user.id, year, week, text, tags)
-    return jsonify({"success": True})
\ No newline at end of file
+    snippet = Snippet.update(
+        g.current_user.id, year, week, text, tags, expected_versions()
+    )
+    response = jsonify({"success": True})
+    return with_validators(response, snippet.etag, snippet.updated_at)
+
+
+def get_weeks_by_cursor(snippets: Query, tag: Optional[str]) -> Response:
+    """Returns a page of snippets from a keyset pagination cursor.
+
+    An empty cursor returns the first page. The total number of snippets is
+    only counted if requested with count=true.
+    """
+    try:
+        page = Snippet.get_page(
+            snippets,
+            per_page=current_app.config["LASTWEEK_SNIPPETS_PER_PAGE"],
+            cursor=request.args["cursor"] or None,
+        )
+    except ValueError:
+        raise ValidationError("invalid cursor")
+    prev = None
+    if page.prev_cursor:
+        prev = url_for("api.get_weeks", cursor=page.prev_cursor, tag=tag)
+    next = None
+    if page.next_cursor:
+        next = url_for("api.get_weeks", cursor=page.next_cursor, tag=tag)
+    json = {
+        "weeks": Snippet.to_json_all(page.items),
+        "prev_url": prev,
+        "next_url": next,
+        "prev_cursor": page.prev_cursor,
+        "next_cursor": page.next_cursor,
+    }
+    if request.args.get("count", "").lower() in ("1", "true"):
+        json["count"] = snippets.order_by(None).count()
+    return jsonify(json)
@@ -42,7 +42,7 @@ def send_token(user, token, message, template):
         user.email,
         message,
         template,
-        user=user,
+        user={"name": user.name},
         token=token,
     )
 
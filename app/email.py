@@ -1,15 +1,244 @@
-from flask import render_template, current_app
+import json
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import groupby
+from typing import Dict, List, Tuple
+
+from flask import Flask, current_app, has_request_context, request
 from flask_mail import Message
+from sqlalchemy.exc import SQLAlchemyError
 
-from app import mail
+from app import db, mail
+from app.models import OutboxMessage
 
+# how long a claimed message has to be sent before it's due again
+CLAIM_LEASE = timedelta(minutes=5)
 
-def send_email(to, subject, template, **kwargs):
-    msg = Message(
-        current_app.config["LASTWEEK_MAIL_SUBJECT_PREFIX"] + subject,
-        sender=current_app.config["LASTWEEK_MAIL_SENDER"],
-        recipients=[to],
+# how often to look for retries that have come due, in seconds
+POLL_INTERVAL = 30
+
+# how many messages to send between commits; committing after each one is
+# slow, but if the process dies or the database fails, whatever was sent
+# since the last commit is sent again
+SENT_COMMIT_INTERVAL = 20
+
+
+def is_email_template(name: str) -> bool:
+    return "email/" in name
+
+
+class EmailTemplates:
+    """The email templates, compiled once when the app starts.
+
+    Compiled templates keep their static text as constants, so rendering one
+    only evaluates its expressions.
+    """
+
+    def __init__(self, app: Flask):
+        env = app.jinja_env
+        self.templates = {
+            name: env.get_template(name)
+            for name in env.list_templates(filter_func=is_email_template)
+        }
+
+    def render(self, name: str, context: Dict) -> str:
+        template = self.templates.get(name)
+        if template is None:
+            template = current_app.jinja_env.get_template(name)
+        return template.render(context)
+
+
+def queue_email(to, subject, template, **kwargs) -> OutboxMessage:
+    """Returns an outbox message for an email, to be rendered when sent.
+
+    The keyword arguments are stored as JSON for the template, so they must
+    be JSON serializable.
+    """
+    base_url = current_app.config["LASTWEEK_BASE_URL"]
+    if base_url is None:
+        if not has_request_context():
+            raise RuntimeError("LASTWEEK_BASE_URL is needed outside requests")
+        base_url = request.url_root
+    return OutboxMessage(
+        recipient=to,
+        subject=current_app.config["LASTWEEK_MAIL_SUBJECT_PREFIX"] + subject,
+        template=template,
+        context=json.dumps(kwargs),
+        base_url=base_url,
     )
-    msg.body = render_template(template + ".txt.j2", **kwargs)
-    msg.html = render_template(template + ".html.j2", **kwargs)
-    mail.send(msg)
\ No newline at end of file
+
+
+def send_email(to, subject, template, **kwargs):
+    """Queues an email, which the mail queue renders and sends later."""
+    db.session.add(queue_email(to, subject, template, **kwargs))
+    db.session.commit()
+    current_app.extensions["mail_queue"].notify()
+
+
+def base_url_of(message: OutboxMessage) -> str:
+    return message.base_url
+
+
+def render_messages(
+    messages: List[OutboxMessage],
+) -> List[Tuple[OutboxMessage, Exception]]:
+    """Renders the bodies of messages queued with a template.
+
+    Returns the messages that couldn't be rendered, with their errors.
+    """
+    templates = current_app.extensions["email_templates"]
+    messages = [message for message in messages if message.template]
+    messages.sort(key=base_url_of)
+    failures = []
+    for (base_url, group) in groupby(messages, base_url_of):
+        # url_for needs a request to build external URLs
+        with current_app.test_request_context(base_url=base_url):
+            for message in group:
+                try:
+                    context = json.loads(message.context)
+                    message.body = templates.render(
+                        message.template + ".txt.j2", context
+                    )
+                    message.html = templates.render(
+                        message.template + ".html.j2", context
+                    )
+                except Exception as e:
+                    failures.append((message, e))
+    return failures
+
+
+def deliver(ids: List[int]) -> int:
+    """Renders and sends the given outbox messages over one SMTP connection.
+
+    Messages that can't be rendered or sent are scheduled to be retried,
+    and the rest are still sent. Returns the number sent.
+    """
+    config = current_app.config
+    retry_delay = config["LASTWEEK_MAIL_RETRY_DELAY"]
+    max_attempts = config["LASTWEEK_MAIL_MAX_ATTEMPTS"]
+    messages = OutboxMessage.query.filter(OutboxMessage.id.in_(ids)).all()
+    sent = 0
+    try:
+        if failures := render_messages(messages):
+            for (message, e) in failures:
+                message.failed(repr(e), retry_delay, max_attempts)
+                messages.remove(message)
+                current_app.logger.warning("failed to render email: %r", e)
+            db.session.commit()
+        with mail.connect() as connection:
+            for (i, message) in enumerate(messages, 1):
+                try:
+                    connection.send(
+                        Message(
+                            message.subject,
+                            sender=config["LASTWEEK_MAIL_SENDER"],
+                            recipients=[message.recipient],
+                            body=message.body,
+                            html=message.html,
+                        )
+                    )
+                except (
+                    smtplib.SMTPRecipientsRefused,
+                    smtplib.SMTPResponseException,
+                ) as e:
+                    message.failed(repr(e), retry_delay, max_attempts)
+                else:
+                    message.sent()
+                    sent += 1
+                if i % SENT_COMMIT_INTERVAL == 0:
+                    db.session.commit()
+            db.session.commit()
+    except SQLAlchemyError as e:
+        # the sent marks since the last commit are lost, so those messages
+        # are sent again once their claims run out
+        db.session.rollback()
+        current_app.logger.warning("failed to record sent email: %r", e)
+    except Exception as e:
+        # the connection failed, so keep the sent marks and retry the rest
+        for message in messages:
+            if message.sent_at is None and message.next_attempt_at:
+                message.failed(repr(e), retry_delay, max_attempts)
+        db.session.commit()
+        current_app.logger.warning("failed to send email: %r", e)
+    return sent
+
+
+class MailQueue:
+    """Sends queued emails from a pool of background threads.
+
+    A dispatcher thread claims due messages from the outbox in batches, and
+    each batch is sent by a worker over one SMTP connection. The dispatcher
+    wakes when an email is queued, and otherwise polls for retries.
+    """
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.workers = app.config["LASTWEEK_MAIL_WORKERS"]
+        self.batch_size = app.config["LASTWEEK_MAIL_BATCH_SIZE"]
+        self._wakeup = threading.Event()
+        self._slots = threading.BoundedSemaphore(max(self.workers, 1))
+        self._lock = threading.Lock()
+        self._executor = None
+        # pick up retries left over from before the app (re)started
+        if self.workers:
+            app.before_first_request(self.notify)
+
+    def notify(self):
+        """Wakes the dispatcher, starting it if needed."""
+        if not self.workers:
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix="mail-worker"
+                )
+                threading.Thread(
+                    target=self._dispatch, name="mail-dispatcher", daemon=True
+                ).start()
+        self._wakeup.set()
+
+    def flush(self) -> int:
+        """Sends every due message from this thread. Returns the number sent.
+
+        This is how mail gets sent if there are no workers.
+        """
+        sent = 0
+        while ids := OutboxMessage.claim_due(self.batch_size, CLAIM_LEASE):
+            sent += deliver(ids)
+        return sent
+
+    def _dispatch(self):
+        while True:
+            self._wakeup.wait(POLL_INTERVAL)
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    self._claim_batches()
+            except Exception:
+                self.app.logger.exception("failed to dispatch email")
+
+    def _claim_batches(self):
+        # a batch is only claimed once a worker is free to send it, so leases
+        # don't run out while batches wait for a worker
+        while True:
+            self._slots.acquire()
+            try:
+                ids = OutboxMessage.claim_due(self.batch_size, CLAIM_LEASE)
+            except Exception:
+                self._slots.release()
+                raise
+            if not ids:
+                self._slots.release()
+                return
+            self._executor.submit(self._deliver, ids)
+
+    def _deliver(self, ids: List[int]):
+        try:
+            with self.app.app_context():
+                deliver(ids)
+        except Exception:
+            self.app.logger.exception("failed to send email")
+        finally:
+            self._slots.release()
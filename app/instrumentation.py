@@ -0,0 +1,99 @@
+import time
+from collections import Counter
+from typing import List, Tuple
+
+from flask import Flask, current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.wrappers import Response
+
+
+class QueryStats:
+    """The SQL statements issued while handling one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Returns statements issued at least threshold times.
+
+        Statements are compared before their parameters are bound, so the
+        same query run once per row of an earlier one shows up here.
+        """
+        return [
+            (statement, count)
+            for (statement, count) in self.statements.most_common()
+            if count >= threshold
+        ]
+
+
+def _before_cursor_execute(conn, cursor, statement, *args):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, *args):
+    start = conn.info["query_start"].pop()
+    if not has_app_context() or "query_stats" not in g:
+        return
+    duration = (time.perf_counter() - start) * 1000
+    g.query_stats.record(statement, duration)
+    if duration >= current_app.config["LASTWEEK_SLOW_QUERY_MS"]:
+        current_app.logger.warning(
+            "slow query (%.1f ms): %s", duration, statement
+        )
+
+
+def _handle_error(context):
+    starts = context.connection.info.get("query_start")
+    if starts:
+        starts.pop()
+
+
+def _start_request():
+    g.query_stats = QueryStats()
+
+
+def _finish_request(response: Response) -> Response:
+    stats = g.pop("query_stats", None)
+    if stats is None:
+        return response
+    threshold = current_app.config["LASTWEEK_N_PLUS_ONE_THRESHOLD"]
+    for (statement, count) in stats.repeated(threshold):
+        current_app.logger.warning(
+            "possible N+1 in %s %s: %d x %s",
+            request.method,
+            request.path,
+            count,
+            statement,
+        )
+    response.headers.add(
+        "Server-Timing",
+        f'db;dur={stats.duration:.1f};desc="{stats.count} queries"',
+    )
+    return response
+
+
+def init_app(app: Flask):
+    """Counts and times the SQL statements of each request, if enabled.
+
+    Totals are sent in a Server-Timing header, statements slower than
+    LASTWEEK_SLOW_QUERY_MS are logged, and so are statements repeated
+    LASTWEEK_N_PLUS_ONE_THRESHOLD or more times in a request.
+    """
+    if not app.config["LASTWEEK_SQL_INSTRUMENTATION"]:
+        return
+    if not event.contains(
+        Engine, "before_cursor_execute", _before_cursor_execute
+    ):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -1,17 +1,19 @@
 from dataclasses import dataclass
 from datetime import date
-from typing import Text, Union
+from typing import List, Text, Union
 
 from flask import render_template, redirect, url_for, request, current_app
 from werkzeug.wrappers import Response
 from flask_login import login_required, current_user
-import markdown
 
 from app.api.errors import ValidationError
+from app.api.routes import tag_completions
+from app.search import highlight_html, search
 from core.date_utils import is_valid_iso_week, this_week
 from app.main import main
 from app.models import (
     Snippet,
+    TagCount,
     User,
 )
 from app.main.forms import SnippetsForm
@@ -28,15 +30,15 @@ class RenderedSnippet:
     tags: list
 
 
-def render_snippet(md: markdown.Markdown, snippet: Snippet) -> RenderedSnippet:
+def render_snippet(snippet: Snippet, tags: List[str]) -> RenderedSnippet:
     return RenderedSnippet(
         email=snippet.user.email,
         id=snippet.user.id,
         year=snippet.year,
         week=snippet.week,
         week_begin=date.fromisocalendar(snippet.year, snippet.week, 1),
-        content=snippet and md.convert(snippet.text),
-        tags=sorted(snippet.tags, key=lambda tag: tag.text),
+        content=snippet.to_html(),
+        tags=sorted(tags),
     )
 
 
@@ -55,7 +57,7 @@ def render_snippet_form(
         name=user.name,
         user_id=user.id,
         week_begin=date.fromisocalendar(year, week, 1),
-        content=text and markdown.markdown(text),
+        content=text and snippet.to_html(),
         form=form,
         tags=tags,
     )
@@ -89,15 +91,61 @@ def edit(year=None, week=None) -> Union[Response, Text]:
 @main.route("/history", methods=["GET", "POST"])
 @login_required
 def history() -> Union[Response, Text]:
-    page = request.args.get("page", 1, type=int)
-    md = markdown.Markdown()
-    snippets = Snippet.get_all(current_user.id, request.args.get("tag"))
-    pagination = snippets.paginate(
-        page,
-        per_page=current_app.config["LASTWEEK_SNIPPETS_PER_PAGE"],
-        error_out=True,
+    """Shows the user's snippets, newest first.
+
+    Pages are found with keyset pagination cursors unless a page number is
+    requested.
+    """
+    tag = request.args.get("tag")
+    snippets = Snippet.get_all(current_user.id, tag)
+    per_page = current_app.config["LASTWEEK_SNIPPETS_PER_PAGE"]
+    if "page" in request.args:
+        page = request.args.get("page", 1, type=int)
+        pagination = snippets.paginate(page, per_page=per_page, error_out=True)
+    else:
+        try:
+            pagination = Snippet.get_page(
+                snippets, per_page, request.args.get("cursor") or None
+            )
+        except ValueError:
+            raise ValidationError("invalid cursor")
+    tags = Snippet.get_tags(pagination.items)
+    snippets = [render_snippet(s, tags[s.id]) for s in pagination.items]
+    return render_template(
+        "history.html.j2",
+        snippets=snippets,
+        pagination=pagination,
+        tag=tag,
+        tag_counts=TagCount.get_all(
+            current_user.id, current_app.config["LASTWEEK_SIDEBAR_TAGS"]
+        ),
     )
-    snippets = [render_snippet(md, s) for s in pagination.items]
+
+
+@main.route("/tags/complete")
+@login_required
+def complete_tags() -> Response:
+    """Autocompletes tags on the edit form, like /api/tags/complete."""
+    return tag_completions(current_user.id)
+
+
+@main.route("/search")
+@login_required
+def search_history() -> Text:
+    """Shows the user's snippets that match a search, best first."""
+    text = request.args.get("q", "")
+    results = search(current_user.id, text)
+    if results is None:
+        return render_template("search.html.j2", q=text, snippets=[])
+    page = request.args.get("page", 1, type=int)
+    per_page = current_app.config["LASTWEEK_SNIPPETS_PER_PAGE"]
+    pagination = results.paginate(page, per_page=per_page, error_out=True)
+    tags = Snippet.get_tags([snippet for (snippet, _, _) in pagination.items])
+    snippets = []
+    for (snippet, _, highlight) in pagination.items:
+        rendered = render_snippet(snippet, tags[snippet.id])
+        rendered.content = highlight_html(highlight)
+        snippets.append(rendered)
     return render_template(
-        "history.html.j2", snippets=snippets, pagination=pagination
+        "search.html.j2", q=text, snippets=snippets, pagination=pagination
     )
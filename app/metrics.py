@@ -0,0 +1,212 @@
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterator, List, Tuple
+
+from flask import Flask, current_app, g, request
+from werkzeug.wrappers import Response
+
+from app import db
+
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Shard:
+    """The metrics recorded by one thread.
+
+    Only its own thread writes to a shard, so recording needs no locks.
+    Scrapes read every shard and add them up. When its thread exits, a
+    shard is merged into one kept for retired threads.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        # endpoint -> bucket counts, then the sum and count of latencies
+        self.latencies: Dict[str, List[float]] = {}
+        # (endpoint, method, status) -> count
+        self.responses: Dict[Tuple[str, str, int], int] = defaultdict(int)
+
+    def observe(self, endpoint: str, seconds: float):
+        latencies = self.latencies.get(endpoint)
+        if latencies is None:
+            latencies = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0]
+            self.latencies[endpoint] = latencies
+        latencies[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        latencies[-2] += seconds
+        latencies[-1] += 1
+
+    def merge(self, other: "Shard"):
+        """Adds the metrics of another shard to this one."""
+        self.in_flight += other.in_flight
+        for (endpoint, counts) in list(other.latencies.items()):
+            latencies = self.latencies.get(endpoint)
+            if latencies is None:
+                self.latencies[endpoint] = list(counts)
+            else:
+                for (i, count) in enumerate(counts):
+                    latencies[i] += count
+        for (key, count) in list(other.responses.items()):
+            self.responses[key] += count
+
+
+class _Owner:
+    """Holds a thread's shard, and is freed with the thread's locals."""
+
+    def __init__(self, shard: Shard):
+        self.shard = shard
+
+
+class Metrics:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Shard] = []
+        # what threads that have exited recorded, so counters never go
+        # backwards but there is only one shard per live thread
+        self._retired = Shard()
+        self._lock = threading.Lock()
+
+    @property
+    def shard(self) -> Shard:
+        owner = getattr(self._local, "owner", None)
+        if owner is None:
+            owner = self._local.owner = _Owner(Shard())
+            weakref.finalize(owner, self._retire, owner.shard)
+            with self._lock:
+                self._shards.append(owner.shard)
+        return owner.shard
+
+    def _retire(self, shard: Shard):
+        with self._lock:
+            self._shards.remove(shard)
+            self._retired.merge(shard)
+
+    def shards(self) -> List[Shard]:
+        """Returns the shards of live threads, and one for exited threads."""
+        with self._lock:
+            retired = Shard()
+            retired.merge(self._retired)
+            return self._shards + [retired]
+
+    def collect(self) -> Iterator[str]:
+        """Yields the metrics in the Prometheus text exposition format."""
+        shards = self.shards()
+        latencies = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 3))
+        responses = defaultdict(int)
+        for shard in shards:
+            for (endpoint, counts) in list(shard.latencies.items()):
+                total = latencies[endpoint]
+                for (i, count) in enumerate(list(counts)):
+                    total[i] += count
+            for (key, count) in list(shard.responses.items()):
+                responses[key] += count
+
+        yield "# HELP lastweek_http_request_duration_seconds Request latency."
+        yield "# TYPE lastweek_http_request_duration_seconds histogram"
+        for (endpoint, counts) in sorted(latencies.items()):
+            cumulative = 0
+            for (bound, count) in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += count
+                yield (
+                    "lastweek_http_request_duration_seconds_bucket"
+                    f'{{endpoint="{endpoint}",le="{bound}"}} {cumulative}'
+                )
+            yield (
+                "lastweek_http_request_duration_seconds_sum"
+                f'{{endpoint="{endpoint}"}} {counts[-2]}'
+            )
+            yield (
+                "lastweek_http_request_duration_seconds_count"
+                f'{{endpoint="{endpoint}"}} {counts[-1]}'
+            )
+
+        yield "# HELP lastweek_http_requests_total Responses sent."
+        yield "# TYPE lastweek_http_requests_total counter"
+        for ((endpoint, method, status), count) in sorted(responses.items()):
+            yield (
+                "lastweek_http_requests_total"
+                f'{{endpoint="{endpoint}",method="{method}",'
+                f'status="{status}"}} {count}'
+            )
+
+        yield "# HELP lastweek_http_requests_in_flight Requests being handled."
+        yield "# TYPE lastweek_http_requests_in_flight gauge"
+        in_flight = sum(shard.in_flight for shard in shards)
+        yield f"lastweek_http_requests_in_flight {in_flight}"
+
+        yield from collect_pool_stats()
+
+
+def collect_pool_stats() -> Iterator[str]:
+    """Yields connection pool gauges, for pools that keep count."""
+    pool = db.get_engine(current_app).pool
+    for (name, stat, description) in (
+        ("size", "size", "Connections the pool keeps open."),
+        ("checked_out", "checkedout", "Connections in use."),
+        ("checked_in", "checkedin", "Idle connections in the pool."),
+        ("overflow", "overflow", "Connections opened beyond the size."),
+    ):
+        if not hasattr(pool, stat):
+            continue
+        yield f"# HELP lastweek_db_pool_{name} {description}"
+        yield f"# TYPE lastweek_db_pool_{name} gauge"
+        yield f"lastweek_db_pool_{name} {getattr(pool, stat)()}"
+
+
+def _start_request():
+    if request.endpoint == "metrics":
+        return
+    current_app.extensions["metrics"].shard.in_flight += 1
+    g.metrics_start = time.perf_counter()
+
+
+def _finish_request(response: Response) -> Response:
+    start = g.get("metrics_start")
+    if start is not None:
+        shard = current_app.extensions["metrics"].shard
+        endpoint = request.endpoint or "unmatched"
+        shard.observe(endpoint, time.perf_counter() - start)
+        shard.responses[(endpoint, request.method, response.status_code)] += 1
+    return response
+
+
+def _teardown_request(exc):
+    if g.pop("metrics_start", None) is not None:
+        current_app.extensions["metrics"].shard.in_flight -= 1
+
+
+def scrape() -> Response:
+    metrics = current_app.extensions["metrics"]
+    return Response(
+        "\n".join(metrics.collect()) + "\n",
+        mimetype="text/plain; version=0.0.4",
+    )
+
+
+def init_app(app: Flask):
+    """Records request metrics and serves them on /metrics, if enabled.
+
+    Latencies and response counts are labelled by endpoint, such as
+    api.get_weeks or main.history.
+    """
+    if not app.config["LASTWEEK_METRICS"]:
+        return
+    app.extensions["metrics"] = Metrics()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule("/metrics", "metrics", scrape)
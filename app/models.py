@@ -1,16 +1,64 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+import hashlib
+import hmac
+from time import time
+from typing import (
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 from flask.globals import current_app
 from flask.helpers import url_for
 from flask_login import UserMixin
+from flask_sqlalchemy import SignallingSession
+import markdown
 from itsdangerous import TimedJSONWebSignatureSerializer as TimedSerializer
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import make_transient_to_detached, validates
 from sqlalchemy.orm.query import Query
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from app import db
 from app import login_manager
-from core.date_utils import iso_week_begin, this_week
+from core.cursors import AFTER, BEFORE, decode_cursor, encode_cursor
+from core.date_utils import is_valid_iso_week, iso_week_begin, this_week
+from core.prefix_index import PrefixIndex
+
+
+# the session info key of the users whose cached tags are out of date
+STALE_TAG_CACHE = "stale_tag_cache"
+
+# INSERT constructs supporting ON CONFLICT clauses, by dialect name
+UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def upsert(table):
+    """Returns an INSERT into table that supports ON CONFLICT clauses."""
+    dialect = db.engine.dialect.name
+    if dialect not in UPSERT_DIALECTS:
+        raise NotImplementedError(f"upsert is not supported on {dialect}")
+    return UPSERT_DIALECTS[dialect](table)
+
+
+class VersionConflict(Exception):
+    """Raised when a write expects a different version of a snippet."""
+
+
+@lru_cache(maxsize=8)
+def get_serializer(secret_key: str, expiration: int = None) -> TimedSerializer:
+    """Returns a shared token serializer for the given key and expiration."""
+    return TimedSerializer(secret_key, expiration)
 
 
 @login_manager.user_loader
@@ -26,6 +74,11 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(128), nullable=False)
     confirmed = db.Column(db.Boolean, default=False, nullable=False)
     member_since = db.Column(db.Date, nullable=False)
+    # bumped with every write to the user's snippets, see Snippet.get_state
+    snippets_version = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    snippets_updated_at = db.Column(db.DateTime)
 
     snippets = db.relationship("Snippet", backref="user", lazy="dynamic")
 
@@ -39,29 +92,73 @@ class User(UserMixin, db.Model):
         return json
 
     def generate_auth_token(self, expiration):
-        s = TimedSerializer(current_app.config["SECRET_KEY"], expiration)
+        s = get_serializer(current_app.config["SECRET_KEY"], expiration)
         return s.dumps({"id": self.id}).decode("utf-8")
 
     def generate_confirmation_token(self, expiration=3600):
-        s = TimedSerializer(current_app.config["SECRET_KEY"], expiration)
+        s = get_serializer(current_app.config["SECRET_KEY"], expiration)
         return s.dumps({"confirm": self.id}).decode("utf-8")
 
     def generate_reset_token(self, expiration=3600):
-        s = TimedSerializer(current_app.config["SECRET_KEY"], expiration)
+        s = get_serializer(current_app.config["SECRET_KEY"], expiration)
         return s.dumps({"reset": self.id}).decode("utf-8")
 
+    @staticmethod
+    def missing_week(year: int, week: int) -> Query:
+        """Returns the confirmed users without a snippet for a week.
+
+        The query is an anti-join against the snippets, ordered by id, and
+        only selects the users' ids, emails and names.
+        """
+        snippet_for_week = db.and_(
+            Snippet.user_id == User.id,
+            Snippet.year == year,
+            Snippet.week == week,
+        )
+        return (
+            db.session.query(User.id, User.email, User.name)
+            .outerjoin(Snippet, snippet_for_week)
+            .filter(Snippet.id.is_(None), User.confirmed.is_(True))
+            .order_by(User.id)
+        )
+
     @staticmethod
     def verify_auth_token(token):
-        s = TimedSerializer(current_app.config["SECRET_KEY"])
+        """Returns the user the given token was generated for, if valid.
+
+        Verified tokens are cached until they expire, so repeated requests
+        with the same token skip both the signature check and the query.
+        """
+        cache = current_app.extensions["token_cache"]
+        if (columns := cache.get(token)) is not None:
+            return User.from_columns(columns)
+        s = get_serializer(current_app.config["SECRET_KEY"])
         try:
-            data = s.loads(token)
+            (data, header) = s.loads(token, return_header=True)
         except:
             return None
-        return User.query.get(data["id"])
+        user = User.query.get(data["id"])
+        if user is not None:
+            cache.set(token, user.to_columns(), ttl=header["exp"] - time())
+        return user
+
+    def to_columns(self) -> dict:
+        """Returns the column values of this user."""
+        return {c.key: getattr(self, c.key) for c in User.__table__.columns}
+
+    @staticmethod
+    def from_columns(columns: dict) -> User:
+        """Adds a user with the given column values to the session.
+
+        The user is assumed to exist in the database and is not reloaded.
+        """
+        user = User(**columns)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
 
     @staticmethod
     def reset_password(token, password):
-        s = TimedSerializer(current_app.config["SECRET_KEY"])
+        s = get_serializer(current_app.config["SECRET_KEY"])
         try:
             data = s.loads(token)
         except:
@@ -76,7 +173,7 @@ class User(UserMixin, db.Model):
         return True
 
     def confirm(self, token):
-        s = TimedSerializer(current_app.config["SECRET_KEY"])
+        s = get_serializer(current_app.config["SECRET_KEY"])
         try:
             data = s.loads(token)
         except:
@@ -95,28 +192,68 @@ class User(UserMixin, db.Model):
     @password.setter
     def password(self, password):
         self.password_hash = generate_password_hash(password)
+        if self.id is not None:
+            current_app.extensions["credential_cache"].pop(self.id)
 
     def verify_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def verify_password_cached(self, password):
+        """Like verify_password, but remembers a recently verified password.
+
+        The cache stores a keyed hash of the email, password hash and
+        password, so it holds no plaintext and misses once any of them
+        change. Only successful verifications are cached.
+        """
+        cache = current_app.extensions["credential_cache"]
+        key = current_app.config["SECRET_KEY"].encode("utf-8")
+        credentials = "\0".join((self.email, self.password_hash, password))
+        digest = hmac.new(
+            key, credentials.encode("utf-8"), hashlib.sha256
+        ).digest()
+        if (cached := cache.get(self.id)) is not None:
+            if hmac.compare_digest(cached, digest):
+                return True
+        if not self.verify_password(password):
+            return False
+        cache.set(self.id, digest)
+        return True
+
     def __repr__(self):
         return f"<User {self.id} {repr(self.email)}>"
 
 
+def tag_texts(texts: Iterable[str]) -> Set[str]:
+    """Returns the distinct tag texts, leaving out blank ones."""
+    return {text for text in texts if text.strip()}
+
+
 class Tag(db.Model):
     __tablename__ = "tags"
     id = db.Column(db.Integer, primary_key=True, nullable=False)
-    text = db.Column(db.UnicodeText, nullable=False)
+    text = db.Column(db.UnicodeText, nullable=False, unique=True, index=True)
 
     @staticmethod
     def get_all(texts: List[str]) -> List[Tag]:
-        tags = []
-        for text in set(texts):
-            tag = Tag.query.filter_by(text=text).first()
-            if not tag:
-                tag = Tag(text=text)
-                db.session.add(tag)
-            tags.append(tag)
+        """Returns the tags with the given texts, creating any missing ones.
+
+        Blank texts are ignored. Existing tags are found with a single query.
+        Missing tags are then inserted together, skipping any that were
+        created concurrently, and loaded with one more query.
+        """
+        texts = tag_texts(texts)
+        if not texts:
+            return []
+        tags = Tag.query.filter(Tag.text.in_(texts)).all()
+        missing = texts - {tag.text for tag in tags}
+        if missing:
+            db.session.execute(
+                upsert(Tag.__table__).on_conflict_do_nothing(
+                    index_elements=["text"]
+                ),
+                [{"text": text} for text in missing],
+            )
+            tags += Tag.query.filter(Tag.text.in_(missing)).all()
         return tags
 
     def __repr__(self):
@@ -125,19 +262,39 @@ class Tag(db.Model):
 
 tagged_snippets = db.Table(
     "tagged_snippets",
-    db.Column("snippet_id", db.Integer, db.ForeignKey("snippets.id")),
-    db.Column("tag_id", db.Integer, db.ForeignKey("tags.id")),
+    db.Column(
+        "snippet_id",
+        db.Integer,
+        db.ForeignKey("snippets.id"),
+        primary_key=True,
+    ),
+    db.Column(
+        "tag_id", db.Integer, db.ForeignKey("tags.id"), primary_key=True
+    ),
+    db.Index("tag_snippets", "tag_id", "snippet_id"),
 )
 
 
 class Snippet(db.Model):
     __tablename__ = "snippets"
-    __table_args__ = (db.Index("iso_week_date", "year", "week"),)
+    __table_args__ = (
+        db.Index("iso_week_date", "year", "week"),
+        db.Index("user_iso_week_date", "user_id", "year", "week", unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     text = db.Column(db.UnicodeText, nullable=False)
+    # text rendered from Markdown, written together with text
+    html = db.Column(db.UnicodeText)
     year = db.Column(db.Integer, nullable=False)
     week = db.Column(db.Integer, nullable=False)
+    # incremented by every Snippet.update
+    version = db.Column(
+        db.Integer, nullable=False, default=1, server_default="1"
+    )
+    updated_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow
+    )
     tags = db.relationship(
         "Tag",
         secondary=tagged_snippets,
@@ -145,6 +302,20 @@ class Snippet(db.Model):
         lazy="dynamic",
     )
 
+    @validates("text")
+    def validate_text(self, key, text):
+        self.html = markdown.markdown(text or "")
+        return text
+
+    def to_html(self) -> str:
+        """Returns this snippet's text rendered from Markdown.
+
+        Snippets written without rendering their text are rendered here.
+        """
+        if self.html is None:
+            return markdown.markdown(self.text or "")
+        return self.html
+
     @staticmethod
     def load_from_json(user_id, json):
         """Loads a snippet from a dictionary.
@@ -159,8 +330,41 @@ class Snippet(db.Model):
         tags = json.get("tags", [])
         return Snippet.update(user_id, year, week, text, tags)
 
-    def to_json(self):
-        """Serializes this snippet to a dictionary."""
+    @staticmethod
+    def validate_json(json) -> Optional[str]:
+        """Returns why a dictionary isn't a valid snippet, or None if it is."""
+        if not isinstance(json, dict):
+            return "expected an object"
+        (year, week) = (json.get("year"), json.get("week"))
+        if not isinstance(year, int) or not isinstance(week, int):
+            return "year and week must be integers"
+        if not is_valid_iso_week(year, week):
+            return "invalid ISO week date"
+        if not isinstance(json.get("text", ""), str):
+            return "text must be a string"
+        tags = json.get("tags", [])
+        if not isinstance(tags, list) or not all(
+            isinstance(tag, str) for tag in tags
+        ):
+            return "tags must be a list of strings"
+        return None
+
+    @staticmethod
+    def load_all_from_json(user_id, jsons: List[dict]) -> List[Snippet]:
+        """Loads several snippets from dictionaries in one transaction.
+
+        Each dictionary is handled as by load_from_json. The snippets are
+        committed to the database and returned.
+        """
+        return Snippet.update_many(user_id, jsons)
+
+    def to_json(self, tags: Optional[List[str]] = None):
+        """Serializes this snippet to a dictionary.
+
+        If tags is given it is used instead of querying this snippet's tags.
+        """
+        if tags is None:
+            tags = [tag.text for tag in self.tags]
         json = {
             "url": url_for(
                 "api.get_week",
@@ -170,10 +374,63 @@ class Snippet(db.Model):
             "year": self.year,
             "week": self.week,
             "text": self.text or "",
-            "tags": [tag.text for tag in self.tags],
+            "tags": tags,
         }
         return json
 
+    @staticmethod
+    def to_json_all(snippets: List[Snippet]) -> List[dict]:
+        """Serializes the given snippets, loading all their tags at once."""
+        tags = Snippet.get_tags(snippets)
+        return [snippet.to_json(tags[snippet.id]) for snippet in snippets]
+
+    @staticmethod
+    def get_tags(snippets: List[Snippet]) -> Dict[int, List[str]]:
+        """Returns the tag texts of each of the given snippets by id.
+
+        The tags for all of the snippets are loaded with a single query.
+        """
+        tags = {snippet.id: [] for snippet in snippets}
+        ids = [id for id in tags if id is not None]
+        if not ids:
+            return tags
+        rows = (
+            db.session.query(tagged_snippets.c.snippet_id, Tag.text)
+            .join(Tag, Tag.id == tagged_snippets.c.tag_id)
+            .filter(tagged_snippets.c.snippet_id.in_(ids))
+        )
+        for (snippet_id, text) in rows:
+            tags[snippet_id].append(text)
+        return tags
+
+    @staticmethod
+    def export(
+        user_id, since: Optional[Tuple[int, int]] = None, batch_size=500
+    ) -> Iterator[dict]:
+        """Serializes all of a user's snippets, oldest first.
+
+        If since is a (year, week), earlier snippets are skipped. Snippets
+        are streamed from the database batch_size at a time, loading the tags
+        of each batch with a single query, so memory use doesn't grow with
+        the number of snippets.
+        """
+        query = Snippet.query.filter_by(user_id=user_id)
+        if since is not None:
+            key = db.tuple_(Snippet.year, Snippet.week)
+            query = query.filter(key >= since)
+        query = (
+            query.order_by(Snippet.year, Snippet.week)
+            .execution_options(stream_results=True)
+            .yield_per(batch_size)
+        )
+        batch = []
+        for snippet in query:
+            batch.append(snippet)
+            if len(batch) == batch_size:
+                yield from Snippet.to_json_all(batch)
+                batch = []
+        yield from Snippet.to_json_all(batch)
+
     @staticmethod
     def get_by_week(user_id: str, year: int, week: int) -> Optional[Snippet]:
         """Returns the specified snippet (or None if it does not exist)."""
@@ -183,15 +440,265 @@ class Snippet(db.Model):
         return snippet.first()
 
     @staticmethod
-    def update(user_id: str, year: int, week: int, text: str, tags: List[str]):
-        snippet = Snippet.get_by_week(user_id, year, week)
-        if not snippet:
-            snippet = Snippet(user_id=user_id, year=year, week=week)
-        snippet.text = text
-        snippet.tags = Tag.get_all(tags)
-        db.session.add(snippet)
+    def update(
+        user_id: str,
+        year: int,
+        week: int,
+        text: str,
+        tags: List[str],
+        if_versions: Optional[Collection[int]] = None,
+    ) -> Snippet:
+        """Creates or replaces the text and tags of the specified snippet.
+
+        The snippet is written with a single upsert, so concurrent saves of
+        the same week can't create duplicate snippets. Its tag links are then
+        replaced, the changes committed, and the snippet returned.
+
+        If if_versions is given, the snippet is only written if its current
+        version is one of them (version 0 meaning it doesn't exist yet), and
+        VersionConflict is raised otherwise.
+        """
+        tag_ids = [tag.id for tag in Tag.get_all(tags)]
+        key = {"user_id": user_id, "year": year, "week": week}
+        values = {
+            "text": text,
+            "html": markdown.markdown(text),
+            "updated_at": datetime.utcnow(),
+        }
+        snippets = Snippet.__table__
+        expected = None
+        if if_versions is not None:
+            expected = snippets.c.version.in_(if_versions)
+        if if_versions is not None and 0 not in if_versions:
+            # the snippet must already exist, so don't try to insert it
+            statement = (
+                snippets.update()
+                .filter_by(**key)
+                .where(expected)
+                .values(version=snippets.c.version + 1, **values)
+            )
+        else:
+            insert = upsert(snippets).values(version=1, **key, **values)
+            statement = insert.on_conflict_do_update(
+                index_elements=["user_id", "year", "week"],
+                set_={
+                    "text": insert.excluded.text,
+                    "html": insert.excluded.html,
+                    "version": snippets.c.version + 1,
+                    "updated_at": insert.excluded.updated_at,
+                },
+                where=expected,
+            )
+        result = db.session.execute(statement)
+        if result.rowcount == 0:
+            db.session.rollback()
+            raise VersionConflict(f"snippet {year}/{week} has changed")
+        snippet_id = db.session.query(Snippet.id).filter_by(**key).scalar()
+        Snippet.replace_tags({snippet_id: tag_ids}, {snippet_id: user_id})
+        Snippet.touch([user_id], values["updated_at"])
+        db.session.commit()
+        return Snippet.query.get(snippet_id)
+
+    @staticmethod
+    def update_many(user_id: str, weeks: List[dict]) -> List[Snippet]:
+        """Creates or replaces several of a user's snippets at once.
+
+        Each week is a dictionary with the year, week, text and tags of a
+        snippet; if a week appears more than once the last one wins. They
+        are written as by write_many, and committed in a single transaction.
+        """
+        written = Snippet.write_many(
+            [dict(week, user_id=user_id) for week in weeks]
+        )
         db.session.commit()
-        return snippet
+        return written
+
+    @staticmethod
+    def write_many(weeks: List[dict]) -> List[Snippet]:
+        """Creates or replaces snippets of any number of users.
+
+        Each week is a dictionary like those of update_many, plus the
+        user_id of its owner. The tags are resolved together, all the
+        snippets written with one executemany upsert and their tag links
+        replaced in bulk. The changes are not committed.
+        """
+        weeks = {
+            (week["user_id"], week["year"], week["week"]): week
+            for week in weeks
+        }
+        if not weeks:
+            return []
+        tags = {
+            key: tag_texts(json.get("tags", []))
+            for (key, json) in weeks.items()
+        }
+        texts = set().union(*tags.values())
+        tag_ids = {tag.text: tag.id for tag in Tag.get_all(texts)}
+        now = datetime.utcnow()
+        snippets = Snippet.__table__
+        insert = upsert(snippets)
+        db.session.execute(
+            insert.on_conflict_do_update(
+                index_elements=["user_id", "year", "week"],
+                set_={
+                    "text": insert.excluded.text,
+                    "html": insert.excluded.html,
+                    "version": snippets.c.version + 1,
+                    "updated_at": insert.excluded.updated_at,
+                },
+            ),
+            [
+                {
+                    "user_id": user_id,
+                    "year": year,
+                    "week": week,
+                    "text": json.get("text", ""),
+                    "html": markdown.markdown(json.get("text", "")),
+                    "version": 1,
+                    "updated_at": now,
+                }
+                for ((user_id, year, week), json) in weeks.items()
+            ],
+        )
+        written = Snippet.query.filter(
+            db.tuple_(Snippet.user_id, Snippet.year, Snippet.week).in_(
+                list(weeks)
+            )
+        ).all()
+        links = {}
+        owners = {}
+        for snippet in written:
+            texts = tags[(snippet.user_id, snippet.year, snippet.week)]
+            links[snippet.id] = [tag_ids[text] for text in texts]
+            owners[snippet.id] = snippet.user_id
+        Snippet.replace_tags(links, owners)
+        Snippet.touch(set(owners.values()), now)
+        return written
+
+    @staticmethod
+    def replace_tags(tag_ids: Dict[int, List[int]], owners: Dict[int, int]):
+        """Replaces the tag links of snippets.
+
+        Tag ids and the ids of the users owning them are given by snippet
+        id. Only the links that change are written, and the users' tag
+        counts are adjusted to match.
+        """
+        old_links = set(
+            db.session.query(
+                tagged_snippets.c.snippet_id, tagged_snippets.c.tag_id
+            ).filter(tagged_snippets.c.snippet_id.in_(list(tag_ids)))
+        )
+        new_links = {
+            (snippet_id, tag_id)
+            for (snippet_id, ids) in tag_ids.items()
+            for tag_id in ids
+        }
+        removed = old_links - new_links
+        added = new_links - old_links
+        if removed:
+            db.session.execute(
+                tagged_snippets.delete().where(
+                    tagged_snippets.c.snippet_id == db.bindparam("s"),
+                    tagged_snippets.c.tag_id == db.bindparam("t"),
+                ),
+                [
+                    {"s": snippet_id, "t": tag_id}
+                    for (snippet_id, tag_id) in removed
+                ],
+            )
+        if added:
+            db.session.execute(
+                tagged_snippets.insert(),
+                [
+                    {"snippet_id": snippet_id, "tag_id": tag_id}
+                    for (snippet_id, tag_id) in added
+                ],
+            )
+        counts = Counter(
+            (owners[snippet_id], tag_id) for (snippet_id, tag_id) in added
+        )
+        counts.subtract(
+            (owners[snippet_id], tag_id) for (snippet_id, tag_id) in removed
+        )
+        TagCount.add(counts)
+
+    @staticmethod
+    def touch(user_ids: Collection[int], updated_at: datetime):
+        """Records a write to the snippets of users, for get_state."""
+        users = User.__table__
+        db.session.execute(
+            users.update()
+            .where(users.c.id.in_(list(user_ids)))
+            .values(
+                snippets_version=users.c.snippets_version + 1,
+                snippets_updated_at=updated_at,
+            )
+        )
+
+    @staticmethod
+    def get_state(user_id) -> Tuple[str, Optional[datetime]]:
+        """Returns a version tag and modification time for a user's snippets.
+
+        The tag changes whenever any of the user's snippets is written. Both
+        are kept on the user by touch, so this is one primary key lookup.
+        """
+        state = (
+            db.session.query(User.snippets_version, User.snippets_updated_at)
+            .filter(User.id == user_id)
+            .one_or_none()
+        )
+        if state is None:
+            return ("0", None)
+        (version, updated_at) = state
+        return (str(version), updated_at)
+
+    @property
+    def etag(self) -> str:
+        """The entity tag of this snippet's current version."""
+        return str(self.version or 0)
+
+    @staticmethod
+    def get_page(
+        query: Query, per_page: int, cursor: Optional[str] = None
+    ) -> SnippetPage:
+        """Returns a page of the snippets found by a get_all query.
+
+        Rather than skipping an offset, pages seek past the (year, week) of
+        the snippet a cursor was made from, so later pages are as cheap as
+        the first. Raises ValueError if the cursor is malformed.
+        """
+        key = db.tuple_(Snippet.year, Snippet.week)
+        if cursor is None:
+            items = query.limit(per_page + 1).all()
+            has_next = len(items) > per_page
+            has_prev = False
+        else:
+            (direction, year, week) = decode_cursor(cursor)
+            if direction == BEFORE:
+                query = query.filter(key < (year, week))
+                items = query.limit(per_page + 1).all()
+                has_next = len(items) > per_page
+                has_prev = True
+            else:
+                query = query.filter(key > (year, week)).order_by(None)
+                query = query.order_by(Snippet.year, Snippet.week)
+                items = query.limit(per_page + 1).all()
+                has_prev = len(items) > per_page
+                has_next = True
+                items = items[:per_page][::-1]
+        items = items[:per_page]
+        page = SnippetPage(items, None, None)
+        if not items:
+            return page
+        if has_prev:
+            page.prev_cursor = encode_cursor(
+                AFTER, items[0].year, items[0].week
+            )
+        if has_next:
+            page.next_cursor = encode_cursor(
+                BEFORE, items[-1].year, items[-1].week
+            )
+        return page
 
     @staticmethod
     def get_all(user_id, tag_text=None) -> Query:
@@ -205,3 +712,287 @@ class Snippet(db.Model):
 
     def __repr__(self):
         return f"<Snippet {self.id} {self.user.email} {self.text} {self.year} {self.week}>"
+
+
+class TagCount(db.Model):
+    """How many of a user's snippets are tagged with a tag.
+
+    Counts are kept up to date by Snippet.replace_tags, so a user's tags
+    can be counted without looking at their snippets.
+    """
+
+    __tablename__ = "tag_counts"
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id"), primary_key=True
+    )
+    tag_id = db.Column(db.Integer, db.ForeignKey("tags.id"), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+
+    @staticmethod
+    def add(counts: Dict[Tuple[int, int], int]):
+        """Adds to users' counts of tags, keyed by user id and tag id.
+
+        Counts may be negative, and tags whose count drops to zero are
+        removed.
+        """
+        rows = [
+            {"user_id": user_id, "tag_id": tag_id, "count": count}
+            for ((user_id, tag_id), count) in counts.items()
+            if count
+        ]
+        if not rows:
+            return
+        user_ids = {row["user_id"] for row in rows}
+        # their cached tags are evicted once the transaction ends, so other
+        # requests can't cache the old counts again in the meantime
+        db.session.info.setdefault(STALE_TAG_CACHE, set()).update(user_ids)
+        table = TagCount.__table__
+        insert = upsert(table)
+        db.session.execute(
+            insert.on_conflict_do_update(
+                index_elements=["user_id", "tag_id"],
+                set_={"count": table.c.count + insert.excluded.count},
+            ),
+            rows,
+        )
+        if any(row["count"] < 0 for row in rows):
+            db.session.execute(
+                table.delete().where(
+                    table.c.user_id.in_(list(user_ids)), table.c.count <= 0
+                )
+            )
+
+    @staticmethod
+    def by_count(user_id: int) -> Query:
+        """Returns a query for the texts and counts of a user's tags."""
+        return (
+            db.session.query(Tag.text, TagCount.count)
+            .join(Tag, Tag.id == TagCount.tag_id)
+            .filter(TagCount.user_id == user_id)
+            .order_by(TagCount.count.desc(), Tag.text)
+        )
+
+    @staticmethod
+    def get_all(
+        user_id: int, limit: Optional[int] = None
+    ) -> List[Tuple[str, int]]:
+        """Returns the texts and counts of a user's tags, most used first.
+
+        If limit is given, only that many of the most used are returned.
+        """
+        return TagCount.by_count(user_id).limit(limit).all()
+
+    @staticmethod
+    def complete(
+        user_id: int, prefix: str, limit: int
+    ) -> List[Tuple[str, int]]:
+        """Returns a user's most used tags that start with prefix, and counts.
+
+        Prefixes match case-insensitively. A user's tags are cached in a
+        PrefixIndex, unless there are more than LASTWEEK_TAG_CACHE_MAX_TAGS
+        of them; then they're found with the prefix index on tag text.
+        """
+        cache = current_app.extensions["tag_cache"]
+        index = cache.get(user_id)
+        if index is None:
+            max_tags = current_app.config["LASTWEEK_TAG_CACHE_MAX_TAGS"]
+            tags = TagCount.by_count(user_id).limit(max_tags + 1).all()
+            # False marks users with too many tags to cache
+            index = PrefixIndex(tags) if len(tags) <= max_tags else False
+            cache.set(user_id, index)
+        if index is not False:
+            return index.complete(prefix, limit)
+        pattern = escape_like(prefix.lower()) + "%"
+        return (
+            TagCount.by_count(user_id)
+            .filter(db.func.lower(Tag.text).like(pattern, escape="\\"))
+            .limit(limit)
+            .all()
+        )
+
+    @staticmethod
+    def rebuild():
+        """Recounts every user's tags from their snippets."""
+        table = TagCount.__table__
+        counts = (
+            db.select(
+                [
+                    Snippet.user_id,
+                    tagged_snippets.c.tag_id,
+                    db.func.count(),
+                ]
+            )
+            .select_from(tagged_snippets.join(Snippet.__table__))
+            .group_by(Snippet.user_id, tagged_snippets.c.tag_id)
+        )
+        db.session.execute(table.delete())
+        db.session.execute(
+            table.insert().from_select(["user_id", "tag_id", "count"], counts)
+        )
+        db.session.commit()
+        current_app.extensions["tag_cache"].clear()
+
+
+def _evict_stale_tags(session):
+    """Evicts the cached tags of users whose counts a transaction changed."""
+    user_ids = session.info.pop(STALE_TAG_CACHE, ())
+    if user_ids:
+        cache = session.app.extensions["tag_cache"]
+        for user_id in user_ids:
+            cache.pop(user_id)
+
+
+event.listen(SignallingSession, "after_commit", _evict_stale_tags)
+event.listen(SignallingSession, "after_rollback", _evict_stale_tags)
+
+
+def escape_like(text: str) -> str:
+    """Escapes the LIKE wildcards in text, for matching with escape="\\"."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# for prefix matches of tag text, as in TagCount.complete; Postgres only uses
+# an index for LIKE under a C collation or with the text_pattern_ops class
+event.listen(
+    Tag.__table__,
+    "after_create",
+    db.DDL(
+        "CREATE INDEX IF NOT EXISTS ix_tags_text_prefix "
+        "ON tags (lower(text) text_pattern_ops)"
+    ).execute_if(dialect="postgresql"),
+)
+
+
+# full-text indexes on snippet text, which Snippet.__table_args__ can't
+# express; see app/search.py for the queries that use them
+SEARCH_INDEX_DDL = {
+    # user_id leads, so a search only reads the index entries of one user's
+    # snippets; btree_gin lets a GIN index hold it
+    "postgresql": [
+        "CREATE EXTENSION IF NOT EXISTS btree_gin",
+        "CREATE INDEX IF NOT EXISTS ix_snippets_search ON snippets "
+        "USING gin (user_id, to_tsvector('english', text))",
+    ],
+    # an external content FTS5 table over snippets, kept in sync by triggers;
+    # user_id is indexed too, so a search can match it along with the words
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS snippets_fts USING fts5("
+        "user_id, text, content='snippets', content_rowid='id', "
+        "tokenize='porter unicode61')",
+        "CREATE TRIGGER IF NOT EXISTS snippets_fts_insert "
+        "AFTER INSERT ON snippets BEGIN "
+        "INSERT INTO snippets_fts(rowid, user_id, text) "
+        "VALUES (new.id, new.user_id, new.text); "
+        "END",
+        "CREATE TRIGGER IF NOT EXISTS snippets_fts_delete "
+        "AFTER DELETE ON snippets BEGIN "
+        "INSERT INTO snippets_fts(snippets_fts, rowid, user_id, text) "
+        "VALUES ('delete', old.id, old.user_id, old.text); "
+        "END",
+        "CREATE TRIGGER IF NOT EXISTS snippets_fts_update "
+        "AFTER UPDATE OF user_id, text ON snippets BEGIN "
+        "INSERT INTO snippets_fts(snippets_fts, rowid, user_id, text) "
+        "VALUES ('delete', old.id, old.user_id, old.text); "
+        "INSERT INTO snippets_fts(rowid, user_id, text) "
+        "VALUES (new.id, new.user_id, new.text); "
+        "END",
+    ],
+}
+for (dialect, statements) in SEARCH_INDEX_DDL.items():
+    for statement in statements:
+        event.listen(
+            Snippet.__table__,
+            "after_create",
+            db.DDL(statement).execute_if(dialect=dialect),
+        )
+event.listen(
+    Snippet.__table__,
+    "before_drop",
+    db.DDL("DROP TABLE IF EXISTS snippets_fts").execute_if(dialect="sqlite"),
+)
+
+
+@dataclass
+class SnippetPage:
+    """A page of snippets, with cursors for the pages either side of it."""
+
+    items: List[Snippet]
+    prev_cursor: Optional[str]
+    next_cursor: Optional[str]
+
+
+class OutboxMessage(db.Model):
+    """An email queued to be sent by the mail queue."""
+
+    __tablename__ = "outbox"
+    id = db.Column(db.Integer, primary_key=True, nullable=False)
+    recipient = db.Column(db.String(320), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    # the template and its JSON context, rendered when the email is sent
+    template = db.Column(db.String(255))
+    context = db.Column(db.UnicodeText)
+    # the root of the external URLs in the email
+    base_url = db.Column(db.String(255))
+    body = db.Column(db.UnicodeText)
+    html = db.Column(db.UnicodeText)
+    created_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow
+    )
+    # when to try sending next, or None once sent or given up on
+    next_attempt_at = db.Column(
+        db.DateTime, index=True, default=datetime.utcnow
+    )
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    sent_at = db.Column(db.DateTime)
+    last_error = db.Column(db.UnicodeText)
+
+    @staticmethod
+    def claim_due(limit: int, lease: timedelta) -> List[int]:
+        """Claims up to limit messages that are due to be sent.
+
+        Claimed messages aren't due again until the lease is up, so other
+        processes sharing the outbox skip them, and they're retried if this
+        one dies before sending them. Returns the ids of the claimed messages.
+        """
+        now = datetime.utcnow()
+        due = (
+            db.session.query(OutboxMessage.id, OutboxMessage.next_attempt_at)
+            .filter(OutboxMessage.next_attempt_at <= now)
+            .order_by(OutboxMessage.next_attempt_at)
+            .limit(limit)
+            .all()
+        )
+        table = OutboxMessage.__table__
+        claimed = []
+        for (id, next_attempt_at) in due:
+            # only claim messages nobody else has claimed since
+            result = db.session.execute(
+                table.update()
+                .where(table.c.id == id)
+                .where(table.c.next_attempt_at == next_attempt_at)
+                .values(
+                    next_attempt_at=now + lease,
+                    attempts=table.c.attempts + 1,
+                )
+            )
+            if result.rowcount:
+                claimed.append(id)
+        db.session.commit()
+        return claimed
+
+    def sent(self):
+        self.sent_at = datetime.utcnow()
+        self.next_attempt_at = None
+        self.last_error = None
+
+    def failed(self, error: str, retry_delay: float, max_attempts: int):
+        """Schedules a retry, backing off exponentially, or gives up."""
+        self.last_error = error
+        if self.attempts >= max_attempts:
+            self.next_attempt_at = None
+            return
+        delay = retry_delay * 2 ** (self.attempts - 1)
+        self.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+    def __repr__(self):
+        return f"<OutboxMessage {self.id} {self.recipient} {self.subject}>"
@@ -0,0 +1,141 @@
+import random
+from datetime import datetime, timedelta
+from typing import Optional
+
+from flask import Flask, current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+import sqlalchemy as sa
+from sqlalchemy import orm
+from werkzeug.wrappers import Response
+
+# requests that may be served from a replica
+READ_ONLY_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# set on responses to requests that wrote, so the user's next requests read
+# from the primary until the replicas have caught up
+STICKY_COOKIE = "lastweek_primary"
+
+# when each user last wrote their snippets, as Snippet.touch records it
+users = sa.table(
+    "users", sa.column("id"), sa.column("snippets_updated_at", sa.DateTime)
+)
+
+
+def request_user_id() -> Optional[int]:
+    """Returns the id of the request's user, if known without a query.
+
+    API requests have authenticated by the time they query snippets, and
+    browsers carry the id in their session.
+    """
+    user = g.get("current_user")
+    if user is not None and not user.is_anonymous:
+        # read from the identity, as loading an expired id would query
+        identity = sa.inspect(user).identity
+        return identity and identity[0]
+    user_id = session.get("_user_id")
+    return int(user_id) if user_id else None
+
+
+def is_read(clause) -> bool:
+    """Returns whether a statement only reads, so a replica can run it."""
+    return (
+        clause is not None
+        and getattr(clause, "is_select", False)
+        and getattr(clause, "_for_update_arg", None) is None
+    )
+
+
+class RoutingSession(SignallingSession):
+    """A session that sends the reads of read-only requests to a replica.
+
+    Everything else goes to the primary: writes, reads outside requests or
+    in requests that may write, reads after a write in the same request, and
+    reads by users who wrote their snippets within the stickiness window.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        # db_replica is only set in requests when there are replicas
+        if has_request_context() and "db_replica" in g:
+            if self._flushing or getattr(clause, "is_dml", False):
+                (g.db_replica, g.db_wrote) = (None, True)
+            elif g.db_replica and is_read(clause):
+                if self.wrote_recently(super().get_bind(mapper, clause)):
+                    g.db_replica = None
+                else:
+                    state = get_state(self.app)
+                    return state.db.get_engine(self.app, g.db_replica)
+        return super().get_bind(mapper, clause)
+
+    def wrote_recently(self, primary) -> bool:
+        """Returns whether the request's user wrote to the primary lately.
+
+        Clients that don't keep the sticky cookie, like API scripts, would
+        otherwise read stale snippets after writing them. The user's last
+        write is looked up on the primary once they're known, which is one
+        primary key lookup per request.
+        """
+        user_id = request_user_id()
+        if user_id is None or g.get("db_checked_user") == user_id:
+            return False
+        g.db_checked_user = user_id
+        connection = self.connection(bind_arguments={"bind": primary})
+        updated_at = connection.execute(
+            sa.select([users.c.snippets_updated_at]).where(
+                users.c.id == user_id
+            )
+        ).scalar()
+        window = timedelta(
+            seconds=current_app.config["LASTWEEK_REPLICA_STICKINESS"]
+        )
+        return (
+            updated_at is not None and updated_at > datetime.utcnow() - window
+        )
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def _choose_replica():
+    (g.db_replica, g.db_checked_user) = (None, None)
+    if request.method not in READ_ONLY_METHODS:
+        return
+    if STICKY_COOKIE in request.cookies:
+        return
+    g.db_replica = random.choice(current_app.extensions["replicas"])
+
+
+def _stick_to_primary(response: Response) -> Response:
+    if g.get("db_wrote"):
+        response.set_cookie(
+            STICKY_COOKIE,
+            "1",
+            max_age=current_app.config["LASTWEEK_REPLICA_STICKINESS"],
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
+
+
+def init_app(app: Flask):
+    """Routes read-only requests to replicas, if any are configured.
+
+    Each replica in LASTWEEK_REPLICA_URIS becomes a SQLAlchemy bind, and a
+    request picks one at random. For LASTWEEK_REPLICA_STICKINESS seconds
+    after a user writes their snippets, their requests read from the
+    primary, so they see their own writes. A request that writes also sets
+    a cookie that does the same for any other writes from that browser.
+    """
+    uris = app.config["LASTWEEK_REPLICA_URIS"]
+    if not uris:
+        return
+    binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+    replicas = []
+    for (i, uri) in enumerate(uris):
+        replicas.append(f"replica{i}")
+        binds[f"replica{i}"] = uri
+    app.config["SQLALCHEMY_BINDS"] = binds
+    app.extensions["replicas"] = replicas
+    app.before_request(_choose_replica)
+    app.after_request(_stick_to_primary)
@@ -0,0 +1,109 @@
+import re
+from typing import List, Optional
+
+from markupsafe import escape
+from sqlalchemy.orm.query import Query
+
+from app import db
+from app.models import Snippet
+
+# marks the matches in highlighted fragments, before they're made into HTML
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+# the Postgres text search configuration, as in the index expression
+TEXT_SEARCH_CONFIG = db.literal_column("'english'")
+
+# the FTS5 table searched on SQLite
+snippets_fts = db.table("snippets_fts", db.column("rowid"))
+
+
+def search_terms(text: str) -> List[str]:
+    """Returns the words of a search; punctuation and operators are ignored."""
+    return re.findall(r"\w+", text)
+
+
+def search_postgresql(user_id: int, terms: List[str]) -> Query:
+    vector = db.func.to_tsvector(TEXT_SEARCH_CONFIG, Snippet.text)
+    tsquery = db.func.plainto_tsquery(TEXT_SEARCH_CONFIG, " ".join(terms))
+    rank = db.func.ts_rank(vector, tsquery)
+    highlight = db.func.ts_headline(
+        TEXT_SEARCH_CONFIG,
+        Snippet.text,
+        tsquery,
+        f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, "
+        "MaxFragments=2, MaxWords=20, MinWords=5",
+    )
+    return (
+        db.session.query(
+            Snippet, rank.label("rank"), highlight.label("highlight")
+        )
+        .filter(Snippet.user_id == user_id, vector.op("@@")(tsquery))
+        .order_by(rank.desc(), Snippet.year.desc(), Snippet.week.desc())
+    )
+
+
+def search_sqlite(user_id: int, terms: List[str]) -> Query:
+    table = db.literal_column("snippets_fts")
+    # quoted, the terms are plain strings rather than FTS5 query syntax;
+    # matching the user too means only their snippets' entries are read
+    match = " AND ".join(
+        [f'user_id : "{user_id}"'] + [f'text : "{term}"' for term in terms]
+    )
+    # bm25 is lower for better matches, so negate it to rank like Postgres;
+    # the user_id column is weighted 0 so it doesn't affect the rank
+    rank = -db.func.bm25(table, 0.0, 1.0)
+    highlight = db.func.snippet(
+        table, 1, HIGHLIGHT_START, HIGHLIGHT_END, "…", 16
+    )
+    return (
+        db.session.query(
+            Snippet, rank.label("rank"), highlight.label("highlight")
+        )
+        .join(snippets_fts, snippets_fts.c.rowid == Snippet.id)
+        .filter(Snippet.user_id == user_id, table.op("MATCH")(match))
+        .order_by(rank.desc(), Snippet.year.desc(), Snippet.week.desc())
+    )
+
+
+# full-text search queries, by dialect name
+SEARCH_DIALECTS = {"postgresql": search_postgresql, "sqlite": search_sqlite}
+
+
+def search(user_id: int, text: str) -> Optional[Query]:
+    """Returns a query for a user's snippets that match a search, best first.
+
+    Snippets match if they contain every word of the search, or words with
+    the same stem. Rows are (snippet, rank, highlight), where highlight is a
+    fragment of the snippet's text with the matches marked, for
+    highlight_html. Returns None if the search has no words.
+    """
+    dialect = db.engine.dialect.name
+    if dialect not in SEARCH_DIALECTS:
+        raise NotImplementedError(f"search is not supported on {dialect}")
+    terms = search_terms(text)
+    if not terms:
+        return None
+    return SEARCH_DIALECTS[dialect](user_id, terms)
+
+
+def highlight_html(highlight: str) -> str:
+    """Escapes a highlighted fragment, marking its matches with <mark>."""
+    return (
+        str(escape(highlight))
+        .replace(HIGHLIGHT_START, "<mark>")
+        .replace(HIGHLIGHT_END, "</mark>")
+    )
+
+
+def rebuild_index():
+    """Rebuilds the full-text index from scratch."""
+    if db.engine.dialect.name == "sqlite":
+        db.session.execute(
+            db.text(
+                "INSERT INTO snippets_fts(snippets_fts) VALUES ('rebuild')"
+            )
+        )
+    elif db.engine.dialect.name == "postgresql":
+        db.session.execute(db.text("REINDEX INDEX ix_snippets_search"))
+    db.session.commit()
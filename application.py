@@ -1,9 +1,11 @@
+from datetime import date
 import os
 
+import click
 from flask_migrate import Migrate
 
 from app import create_app, db
-from app.models import User, Snippet, Tag, tagged_snippets
+from app.models import User, Snippet, Tag, TagCount, tagged_snippets
 
 application = create_app(os.getenv("FLASK_CONFIG") or "default")
 migrate = Migrate(application, db)
@@ -16,18 +18,205 @@ def make_shell_context():
         User=User,
         Snippet=Snippet,
         Tag=Tag,
+        TagCount=TagCount,
         tagged_snippets=tagged_snippets,
     )
 
 
 @application.cli.command()
-def fill_db():
+@click.option("--users", default=20, show_default=True)
+@click.option("--tags", default=100, show_default=True)
+@click.option("--snippets", default=1000, show_default=True)
+@click.option("--seed", type=int, help="Seed for reproducible data.")
+@click.option("--batch-size", default=10000, show_default=True)
+@click.option(
+    "--last-week",
+    help="ISO week date of the latest snippets (default: 2026-W01).",
+)
+@click.option(
+    "--tag-skew",
+    type=click.FloatRange(min=0),
+    default=1.1,
+    show_default=True,
+    help="Zipf exponent of tag popularity (0 for uniform).",
+)
+@click.option(
+    "--user-skew",
+    type=float,
+    default=1.2,
+    show_default=True,
+    help="Pareto shape of users' shares of snippets (lower is more skewed).",
+)
+@click.option(
+    "--text-mu",
+    type=float,
+    default=1.5,
+    show_default=True,
+    help="Mean of the log of snippet lengths in sentences.",
+)
+@click.option(
+    "--text-sigma",
+    type=click.FloatRange(min=0),
+    default=0.8,
+    show_default=True,
+    help="Standard deviation of the log of snippet lengths.",
+)
+def fill_db(
+    users,
+    tags,
+    snippets,
+    seed,
+    batch_size,
+    last_week,
+    tag_skew,
+    user_skew,
+    text_mu,
+    text_sigma,
+):
     """Fills the dev database with fake data."""
     if not application.config.get("DEV"):
         return
-    from fill_db import fill_db
+    from core.date_utils import parse_iso_week
+    from fill_db import LAST_WEEK, fill_db
 
-    fill_db(db)
+    try:
+        last_week = (
+            date.fromisocalendar(*parse_iso_week(last_week), 1)
+            if last_week
+            else LAST_WEEK
+        )
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--last-week")
+    if user_skew <= 0:
+        raise click.BadParameter("must be positive", param_hint="--user-skew")
+    fill_db(
+        db,
+        user_count=users,
+        tag_count=tags,
+        snippet_count=snippets,
+        seed=seed,
+        batch_size=batch_size,
+        last_week=last_week,
+        tag_skew=tag_skew,
+        user_skew=user_skew,
+        text_mu=text_mu,
+        text_sigma=text_sigma,
+    )
+
+
+@application.cli.command()
+@click.argument("dump", type=click.File("r"))
+@click.option(
+    "--format",
+    "dump_format",
+    type=click.Choice(["ndjson", "csv"]),
+    help="Format of the dump (inferred from its name by default).",
+)
+@click.option("--email", help="Owner of snippets that don't name a user.")
+@click.option("--batch-size", default=1000, show_default=True)
+def import_snippets(dump, dump_format, email, batch_size):
+    """Imports snippets from an NDJSON or CSV dump ("-" for stdin)."""
+    from import_snippets import import_snippets, read_csv, read_ndjson
+
+    if dump_format is None:
+        dump_format = "csv" if dump.name.endswith(".csv") else "ndjson"
+    read = read_csv if dump_format == "csv" else read_ndjson
+    import_snippets(db, read(dump), email, batch_size, echo=click.echo)
+
+
+@application.cli.command()
+def send_mail():
+    """Sends the queued emails that are due."""
+    sent = application.extensions["mail_queue"].flush()
+    click.echo(f"Sent {sent} emails.")
+
+
+@application.cli.command()
+def reindex_search():
+    """Rebuilds the full-text search index of snippets."""
+    from app.search import rebuild_index
+
+    rebuild_index()
+    click.echo("Done.")
+
+
+@application.cli.command()
+def rebuild_tag_counts():
+    """Recounts every user's tags from their snippets."""
+    TagCount.rebuild()
+    click.echo("Done.")
+
+
+@application.cli.command()
+@click.option("--week", help="ISO week date, like 2021-W16 (default: now).")
+@click.option("--batch-size", default=1000, show_default=True)
+@click.option("--workers", default=4, show_default=True)
+@click.option("--after-id", default=0, help="Resume after this user id.")
+def send_reminders(week, batch_size, workers, after_id):
+    """Emails users who haven't written a snippet for the week."""
+    from core.date_utils import parse_iso_week
+    from reminders import send_reminders
+
+    if application.config["LASTWEEK_BASE_URL"] is None:
+        raise click.UsageError("LASTWEEK_BASE_URL must be set.")
+    try:
+        iso_week = week and parse_iso_week(week)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--week")
+    send_reminders(
+        db, iso_week, batch_size, workers, after_id, echo=click.echo
+    )
+
+
+@application.cli.command()
+@click.option(
+    "--scale",
+    "scales",
+    multiple=True,
+    default=["small"],
+    show_default=True,
+    type=click.Choice(["small", "medium", "large"]),
+)
+@click.option("--iterations", default=100, show_default=True)
+@click.option("--seed", default=1, show_default=True)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default="benchmark.json",
+    show_default=True,
+)
+@click.option(
+    "--baseline",
+    type=click.File("r"),
+    help="Results of an earlier run to check for regressions against.",
+)
+@click.option(
+    "--threshold",
+    default=0.2,
+    show_default=True,
+    help="Slowdown allowed before a regression, as a fraction.",
+)
+def bench(scales, iterations, seed, output, baseline, threshold):
+    """Benchmarks the hot paths against seeded databases."""
+    import json
+    import sys
+
+    from benchmark import SCALES, compare, run_benchmarks
+
+    results = run_benchmarks(
+        {scale: SCALES[scale] for scale in scales},
+        iterations,
+        seed,
+        echo=click.echo,
+    )
+    json.dump(results, output, indent=2)
+    if baseline is None:
+        return
+    regressions = compare(json.load(baseline), results, threshold)
+    for regression in regressions:
+        click.echo(f"Regression: {regression}", err=True)
+    if regressions:
+        sys.exit(1)
 
 
 @application.cli.command()
@@ -0,0 +1,235 @@
+"""Benchmarks the API and web hot paths at several database scales.
+
+Results are plain JSON, so a run can be kept and compared against later ones
+to catch regressions.
+"""
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from base64 import b64encode
+from dataclasses import dataclass
+from datetime import datetime
+from os import path
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import Snippet, User
+from fill_db import fill_db
+
+# fill_db arguments for each database scale
+SCALES = {
+    "small": dict(user_count=20, tag_count=100, snippet_count=1000),
+    "medium": dict(user_count=200, tag_count=1000, snippet_count=50000),
+    "large": dict(user_count=2000, tag_count=5000, snippet_count=500000),
+}
+
+# metrics compared against a baseline, and whether any increase at all is a
+# regression rather than only one beyond the threshold
+COMPARED_METRICS = {
+    "p50_ms": False,
+    "p99_ms": False,
+    "queries": True,
+    "peak_alloc_kib": False,
+}
+
+
+@dataclass
+class Benchmark:
+    name: str
+    method: str
+    url: str
+    # web views use a logged in session instead of an API token
+    web: bool = False
+
+
+def benchmarks(year: int, week: int) -> List[Benchmark]:
+    return [
+        Benchmark("api_weeks", "GET", "/api/weeks/"),
+        Benchmark("api_week_get", "GET", f"/api/weeks/{year}/{week}"),
+        Benchmark("api_week_put", "PUT", f"/api/weeks/{year}/{week}"),
+        Benchmark("history", "GET", "/history", web=True),
+        Benchmark("edit", "GET", f"/edit/{year}/{week}", web=True),
+    ]
+
+
+class QueryCounter:
+    """Counts the SQL statements an engine executes while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self) -> "QueryCounter":
+        event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._count)
+
+
+def percentile(samples: List[float], p: int) -> float:
+    if len(samples) < 2:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[p - 1]
+
+
+def run_benchmark(
+    client, engine, benchmark: Benchmark, headers, iterations, alloc_runs=5
+) -> dict:
+    """Times a request, and measures its queries and peak allocations.
+
+    Allocations are measured in separate runs, since tracing them slows
+    down every request.
+    """
+    kwargs = {"headers": {} if benchmark.web else headers}
+    if benchmark.method == "PUT":
+        kwargs["json"] = {"text": "*benchmarked*", "tags": ["benchmark"]}
+
+    def request():
+        response = client.open(
+            benchmark.url, method=benchmark.method, **kwargs
+        )
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"{benchmark.name}: {benchmark.method} {benchmark.url} "
+                f"returned {response.status_code}"
+            )
+
+    for _ in range(min(iterations, 10)):
+        request()
+
+    timings = []
+    queries = []
+    for _ in range(iterations):
+        with QueryCounter(engine) as counter:
+            start = time.perf_counter()
+            request()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+
+    peaks = []
+    for _ in range(alloc_runs):
+        # restarting tracing resets the peak, which reset_peak only does
+        # from Python 3.9
+        tracemalloc.start()
+        try:
+            request()
+            (_, peak) = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peaks.append(peak / 1024)
+
+    return {
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "queries": max(queries),
+        "peak_alloc_kib": round(statistics.median(peaks), 1),
+    }
+
+
+def run_scale(database_url, scale: dict, iterations, seed, echo) -> dict:
+    app = create_app("testing")
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    with app.app_context():
+        db.session.remove()
+        fill_db(db, seed=seed, **scale)
+        # benchmark the user with the most snippets, at their latest week
+        (user_id,) = (
+            db.session.query(Snippet.user_id)
+            .group_by(Snippet.user_id)
+            .order_by(db.func.count().desc(), Snippet.user_id)
+            .first()
+        )
+        user = User.query.get(user_id)
+        latest = Snippet.get_all(user_id).first()
+        token = user.generate_auth_token(expiration=3600)
+        key = b64encode(f"{token}:".encode("utf-8")).decode("utf-8")
+        headers = {
+            "Authorization": f"Basic {key}",
+            "Accept": "application/json",
+        }
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user.id)
+            session["_fresh"] = True
+
+        engine = db.get_engine(app)
+        results = {}
+        for benchmark in benchmarks(latest.year, latest.week):
+            results[benchmark.name] = run_benchmark(
+                client, engine, benchmark, headers, iterations
+            )
+            echo(f"  {benchmark.name}: {results[benchmark.name]}")
+        db.session.remove()
+        engine.dispose()
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            cwd=path.dirname(path.abspath(__file__)),
+            text=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.strip()
+
+
+def run_benchmarks(
+    scales: Dict[str, dict], iterations=100, seed=1, echo=print
+) -> dict:
+    """Benchmarks each scale against a fresh, seeded SQLite database."""
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "date": datetime.utcnow().isoformat(timespec="seconds"),
+        "iterations": iterations,
+        "seed": seed,
+        "scales": {},
+    }
+    with tempfile.TemporaryDirectory() as data_dir:
+        for (name, scale) in scales.items():
+            echo(f"Benchmarking {name} database ({scale})...")
+            url = "sqlite:///" + path.join(data_dir, f"{name}.sqlite")
+            results["scales"][name] = run_scale(
+                url, scale, iterations, seed, echo
+            )
+    return results
+
+
+def compare(baseline: dict, results: dict, threshold=0.2) -> List[str]:
+    """Returns the regressions in results since baseline.
+
+    A latency or allocation metric regresses when it grows by more than the
+    threshold, as a fraction of its baseline; any increase in the number of
+    queries is a regression. Only benchmarks present in both are compared.
+    """
+    regressions = []
+    for (scale, scale_results) in results["scales"].items():
+        for (name, metrics) in scale_results.items():
+            before = baseline["scales"].get(scale, {}).get(name)
+            if before is None:
+                continue
+            for (metric, exact) in COMPARED_METRICS.items():
+                (old, new) = (before.get(metric), metrics.get(metric))
+                if old is None or new is None:
+                    continue
+                limit = old if exact else old * (1 + threshold)
+                if new > limit:
+                    regressions.append(
+                        f"{scale}/{name}: {metric} went from {old} to {new}"
+                    )
+    return regressions
@@ -7,13 +7,66 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     MAIL_SERVER = environ.get("MAIL_SERVER", "smtp.gmail.com")
     MAIL_PORT = int(environ.get("MAIL_PORT", "587"))
-    MAIL_USE_TLS = True
+    MAIL_USE_TLS = environ.get("MAIL_USE_TLS", "1") == "1"
     MAIL_USERNAME = environ.get("MAIL_USERNAME")
     MAIL_PASSWORD = environ.get("MAIL_PASSWORD")
     LASTWEEK_MAIL_SUBJECT_PREFIX = "[lastweek] "
     LASTWEEK_MAIL_SENDER = "lastweek admin <admin@lastweek.dev>"
     LASTWEEK_ADMIN = environ.get("LASTWEEK_ADMIN")
+    # threads sending queued email; with none, only `flask send-mail` does
+    LASTWEEK_MAIL_WORKERS = int(environ.get("LASTWEEK_MAIL_WORKERS", "2"))
+    LASTWEEK_MAIL_BATCH_SIZE = 50
+    LASTWEEK_MAIL_MAX_ATTEMPTS = 5
+    # seconds before the first retry of an email, doubling after that
+    LASTWEEK_MAIL_RETRY_DELAY = 60
+    # external URLs in emails start with this, or else the requesting URL
+    LASTWEEK_BASE_URL = environ.get("LASTWEEK_BASE_URL")
     LASTWEEK_SNIPPETS_PER_PAGE = 10
+    LASTWEEK_MAX_BATCH_WEEKS = 520
+    LASTWEEK_TOKEN_CACHE_SIZE = int(
+        environ.get("LASTWEEK_TOKEN_CACHE_SIZE", "10000")
+    )
+    LASTWEEK_TOKEN_CACHE_TTL = int(
+        environ.get("LASTWEEK_TOKEN_CACHE_TTL", "300")
+    )
+    # verified API passwords are only cached if this is set
+    LASTWEEK_CREDENTIAL_CACHE_TTL = int(
+        environ.get("LASTWEEK_CREDENTIAL_CACHE_TTL", "0")
+    )
+    LASTWEEK_CREDENTIAL_CACHE_SIZE = int(
+        environ.get("LASTWEEK_CREDENTIAL_CACHE_SIZE", "10000")
+    )
+    # users whose tags are cached for autocompletion, and for how long
+    LASTWEEK_TAG_CACHE_SIZE = int(
+        environ.get("LASTWEEK_TAG_CACHE_SIZE", "10000")
+    )
+    LASTWEEK_TAG_CACHE_TTL = int(environ.get("LASTWEEK_TAG_CACHE_TTL", "60"))
+    # users with more tags than this autocomplete from the database
+    LASTWEEK_TAG_CACHE_MAX_TAGS = 5000
+    # the most used tags listed on the history page; /api/tags lists them all
+    LASTWEEK_SIDEBAR_TAGS = int(environ.get("LASTWEEK_SIDEBAR_TAGS", "50"))
+    # read-only requests are served from these databases, see app/replicas.py
+    LASTWEEK_REPLICA_URIS = [
+        uri
+        for uri in environ.get("LASTWEEK_REPLICA_URIS", "").split(",")
+        if uri
+    ]
+    # seconds a user reads from the primary after writing to it
+    LASTWEEK_REPLICA_STICKINESS = int(
+        environ.get("LASTWEEK_REPLICA_STICKINESS", "10")
+    )
+    # per-request SQL statement counts and timings, see app/instrumentation.py
+    LASTWEEK_SQL_INSTRUMENTATION = bool(
+        environ.get("LASTWEEK_SQL_INSTRUMENTATION")
+    )
+    LASTWEEK_SLOW_QUERY_MS = float(
+        environ.get("LASTWEEK_SLOW_QUERY_MS", "100")
+    )
+    LASTWEEK_N_PLUS_ONE_THRESHOLD = int(
+        environ.get("LASTWEEK_N_PLUS_ONE_THRESHOLD", "5")
+    )
+    # request metrics served on /metrics, see app/metrics.py
+    LASTWEEK_METRICS = bool(environ.get("LASTWEEK_METRICS"))
 
     @staticmethod
     def init_app(app):
@@ -32,7 +85,9 @@ class TestingConfig(Config):
     SECRET_KEY = "testing secret key"
     SQLALCHEMY_DATABASE_URI = "sqlite://"
     WTF_CSRF_ENABLED = False
+    LASTWEEK_MAIL_WORKERS = 0
     SERVER_NAME = "lastweek-test.localdomain"
+    LASTWEEK_BASE_URL = "http://lastweek-test.localdomain/"
 
 RDS_HOSTNAME = environ.get("RDS_HOSTNAME")
 RDS_PORT = environ.get("RDS_PORT")
@@ -44,6 +99,13 @@ RDS_SQLALCHEMY_URL = f"postgresql://{RDS_USERNAME}:{RDS_PASSWORD}@{RDS_HOSTNAME}
 class ProductionConfig(Config):
     SECRET_KEY = environ.get("SECRET_KEY")
     SQLALCHEMY_DATABASE_URI = environ.get("DATABASE_URL") or RDS_SQLALCHEMY_URL
+    # each request thread holds a connection while it waits on the database,
+    # so a threaded server needs at least as many connections as threads;
+    # the defaults are SQLAlchemy's, but can be raised to match --threads
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": int(environ.get("LASTWEEK_DB_POOL_SIZE", "5")),
+        "max_overflow": int(environ.get("LASTWEEK_DB_MAX_OVERFLOW", "10")),
+    }
 
 
 config = {
@@ -0,0 +1,28 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from typing import Tuple
+
+# directions a cursor can page in from its ISO week date
+BEFORE = "before"
+AFTER = "after"
+
+
+def encode_cursor(direction: str, year: int, week: int) -> str:
+    """Returns an opaque cursor for paging in direction from a week."""
+    key = f"{direction}:{year}:{week}".encode("utf-8")
+    return urlsafe_b64encode(key).decode("utf-8").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int, int]:
+    """Returns the (direction, year, week) encoded in a cursor.
+
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        key = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        (direction, year, week) = key.decode("utf-8").split(":")
+        if direction not in (BEFORE, AFTER):
+            raise ValueError(f"invalid cursor direction: {direction}")
+        return (direction, int(year), int(week))
+    except (DecodeError, UnicodeDecodeError) as e:
+        raise ValueError("invalid cursor") from e
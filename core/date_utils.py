@@ -1,6 +1,9 @@
 from datetime import date
+import re
 from typing import Tuple
 
+ISO_WEEK_PATTERN = re.compile(r"(\d{4})-?W(\d{2})")
+
 
 def is_valid_iso_week(year: int, week: int) -> bool:
     (max_year, max_week) = this_week()
@@ -18,3 +21,16 @@ def this_week() -> Tuple[int, int]:
 def iso_week_begin(d: date) -> date:
     iso = d.isocalendar()
     return date.fromisocalendar(iso[0], iso[1], 1)
+
+
+def parse_iso_week(text: str) -> Tuple[int, int]:
+    """Parses an ISO 8601 week date like 2021-W16 into (year, week).
+
+    Raises ValueError if the text is not a valid ISO week date.
+    """
+    if (match := ISO_WEEK_PATTERN.fullmatch(text)) is None:
+        raise ValueError(f"invalid ISO week date: {text}")
+    (year, week) = (int(match[1]), int(match[2]))
+    if not is_valid_iso_week(year, week):
+        raise ValueError(f"invalid ISO week date: {text}")
+    return (year, week)
@@ -0,0 +1,37 @@
+from bisect import bisect_left
+import heapq
+from typing import Iterable, List, Tuple
+
+
+class PrefixIndex:
+    """Weighted strings, sorted for finding the heaviest with a prefix.
+
+    Prefixes match case-insensitively. Finding the strings with a prefix is a
+    binary search, and only those strings are ranked.
+    """
+
+    def __init__(self, items: Iterable[Tuple[str, int]]):
+        self._entries = sorted(
+            (text.lower(), text, weight) for (text, weight) in items
+        )
+        self._keys = [key for (key, _, _) in self._entries]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def complete(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        """Returns the heaviest strings starting with prefix, and weights.
+
+        Ties are broken alphabetically.
+        """
+        prefix = prefix.lower()
+        start = bisect_left(self._keys, prefix)
+        end = start
+        while end < len(self._keys) and self._keys[end].startswith(prefix):
+            end += 1
+        matches = heapq.nsmallest(
+            limit,
+            self._entries[start:end],
+            key=lambda entry: (-entry[2], entry[1]),
+        )
+        return [(text, weight) for (_, text, weight) in matches]
@@ -1,93 +1,234 @@
+import math
 import random
-from datetime import date
-from mimesis.providers.generic import Generic
+from datetime import date, datetime, timedelta
+from itertools import accumulate, islice
+from typing import Iterator, List
 
-from sqlalchemy.exc import IntegrityError
+import markdown
+from mimesis.providers.generic import Generic
+from werkzeug.security import generate_password_hash
 
-from app.models import Snippet, User, Tag
+from app.models import Snippet, Tag, TagCount, User, tagged_snippets
 from core.date_utils import iso_week_begin
 
+# the earliest and latest weeks fake snippets are written for; the range is
+# fixed, rather than running up to today, so a seed gives the same data on
+# any day
+FIRST_WEEK = date(2000, 1, 3)
+LAST_WEEK = date(2025, 12, 29)
+
 
 class LastweekFaker:
-    def __init__(self, db, faker):
-        self.db = db
-        self.faker = faker
-        self.users = {}
-        self.user_emails = []
-        self.user_snippet_dates = {}
-        self.snippets = []
-        self.tags = {}
-        self.words = []
-
-    def commit_all(self):
-        for user in self.users.values():
-            self.db.session.add(user)
-        for snippet in self.snippets:
-            self.db.session.add(snippet)
-        self.db.session.commit()
-
-    def fake_user(self, password):
-        """Creates a fake user with the given password."""
-        email = self.faker.person.email(unique=True)
-        user = User(
-            email=email,
-            name=self.faker.person.full_name(),
-            password=password,
-            confirmed=True,
-            member_since=date.fromtimestamp(0),
-        )
-        self.users[email] = user
-        self.user_emails.append(email)
-        self.user_snippet_dates[email] = set()
+    """Generates fake users, tags and snippets.
+
+    Everything generated is determined by the seed. Tag popularity follows a
+    Zipf distribution with exponent tag_skew, users' shares of the snippets
+    follow a Pareto distribution with shape user_skew, and snippet lengths in
+    sentences are log-normally distributed with parameters text_mu and
+    text_sigma.
+    """
+
+    def __init__(
+        self,
+        seed=None,
+        tag_skew=1.1,
+        user_skew=1.2,
+        text_mu=1.5,
+        text_sigma=0.8,
+        last_week=LAST_WEEK,
+    ):
+        self.random = random.Random(seed)
+        self.faker = Generic(seed=seed)
+        self.tag_skew = tag_skew
+        self.user_skew = user_skew
+        self.text_mu = text_mu
+        self.text_sigma = text_sigma
+        self.md = markdown.Markdown()
+        self.sentences = [self.faker.text.sentence() for _ in range(1000)]
+        weeks = (iso_week_begin(last_week) - FIRST_WEEK).days // 7 + 1
+        self.weeks = [FIRST_WEEK + timedelta(weeks=i) for i in range(weeks)]
 
-    def fake_tag(self):
-        while True:
+    def fake_users(self, first_id, count, password) -> Iterator[dict]:
+        # hashing is deliberately slow, so all users share one hash
+        password_hash = generate_password_hash(password)
+        now = datetime.utcnow()
+        for id in range(first_id, first_id + count):
+            yield {
+                "id": id,
+                "email": f"user{id}@example.com",
+                "name": self.faker.person.full_name(),
+                "password_hash": password_hash,
+                "confirmed": True,
+                "member_since": date.fromtimestamp(0),
+                # their snippets are inserted directly, without touching them
+                "snippets_version": 1,
+                "snippets_updated_at": now,
+            }
+
+    def fake_tag_texts(self, count) -> List[str]:
+        """Returns count distinct words, numbering them once words run out."""
+        texts = []
+        seen = set()
+        while len(texts) < count:
             word = self.faker.text.word()
-            if word not in self.tags:
-                self.tags[word] = Tag(text=word)
-                self.words.append(word)
-                break
-
-    def fake_snippet(self):
-        """Creates a fake snippet for a random user from the given set."""
-        user_email = random.choice(self.user_emails)
-        user = self.users[user_email]
-        dates = self.user_snippet_dates[user_email]
-        date = None
-        while True:
-            date = iso_week_begin(self.faker.datetime.date())
-            if date not in dates:
-                break
-        dates.add(date)
-        (year, week, _) = date.isocalendar()
-        tag_count = random.randint(0, min(3, len(self.words)))
-        tag_texts = random.sample(self.words, tag_count)
-        tags = [self.tags[text] for text in tag_texts]
-        snippet = Snippet(
-            user=user,
-            text=self.faker.text.text(),
-            year=year,
-            week=week,
-            tags=tags,
+            if word in seen:
+                word = f"{word}{len(texts)}"
+            seen.add(word)
+            texts.append(word)
+        return texts
+
+    def snippet_counts(self, user_count, snippet_count) -> List[int]:
+        """Divides snippet_count between users with a long-tailed skew.
+
+        No user gets more snippets than there are weeks to write them for.
+        """
+        weights = [
+            self.random.paretovariate(self.user_skew)
+            for _ in range(user_count)
+        ]
+        total = sum(weights)
+        capacity = len(self.weeks)
+        counts = [
+            min(capacity, math.floor(snippet_count * w / total))
+            for w in weights
+        ]
+        # hand out what rounding and capping left over, heaviest users first
+        remaining = min(snippet_count, capacity * user_count) - sum(counts)
+        by_weight = sorted(range(user_count), key=lambda i: -weights[i])
+        while remaining > 0:
+            for i in by_weight:
+                if remaining == 0:
+                    break
+                if counts[i] < capacity:
+                    counts[i] += 1
+                    remaining -= 1
+        return counts
+
+    def fake_text(self) -> str:
+        length = self.random.lognormvariate(self.text_mu, self.text_sigma)
+        length = max(1, round(length))
+        return " ".join(self.random.choices(self.sentences, k=length))
+
+    def fake_snippets(
+        self, first_id, user_ids, snippet_counts, tag_ids
+    ) -> Iterator[dict]:
+        """Generates snippets and their tag links.
+
+        Each snippet's tag_ids are chosen from tag_ids, given in order of
+        popularity. A user's weeks are drawn without replacement, so filling
+        a user's calendar never takes longer.
+        """
+        popularity = (
+            1 / rank**self.tag_skew for rank in range(1, 1 + len(tag_ids))
         )
-        self.snippets.append(snippet)
+        tag_weights = list(accumulate(popularity))
+        now = datetime.utcnow()
+        id = first_id
+        for (user_id, count) in zip(user_ids, snippet_counts):
+            for monday in self.random.sample(self.weeks, count):
+                (year, week, _) = monday.isocalendar()
+                text = self.fake_text()
+                tag_count = self.random.choice((0, 1, 1, 2, 2, 3))
+                tags = set()
+                if tag_ids:
+                    tags = set(
+                        self.random.choices(
+                            tag_ids, cum_weights=tag_weights, k=tag_count
+                        )
+                    )
+                yield {
+                    "id": id,
+                    "user_id": user_id,
+                    "year": year,
+                    "week": week,
+                    "text": text,
+                    "html": self.md.reset().convert(text),
+                    "version": 1,
+                    "updated_at": now,
+                    "tag_ids": tags,
+                }
+                id += 1
+
+
+def next_id(db, model) -> int:
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+def insert_batches(db, table, rows, batch_size) -> int:
+    """Inserts rows with executemany, batch_size at a time."""
+    count = 0
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+        count += len(batch)
+    return count
 
 
 def fill_db(
-    db, password="p@ssw0rd", user_count=20, tag_count=100, snippet_count=1000
+    db,
+    password="p@ssw0rd",
+    user_count=20,
+    tag_count=100,
+    snippet_count=1000,
+    seed=None,
+    batch_size=10000,
+    last_week=LAST_WEEK,
+    **distributions,
 ):
+    """Inserts fake users, tags and snippets.
+
+    Any other keyword arguments are passed to LastweekFaker to shape the
+    distributions of tags, users and snippet lengths.
+    """
     print("Filling dev database with fake data...")
     db.create_all()
-    faker = LastweekFaker(db, Generic())
-    for i in range(user_count):
-        faker.fake_user(password)
+    faker = LastweekFaker(seed, last_week=last_week, **distributions)
+
+    first_user_id = next_id(db, User)
+    users = faker.fake_users(first_user_id, user_count, password)
+    insert_batches(db, User.__table__, users, batch_size)
     print(f"Created {user_count} users.")
-    for i in range(tag_count):
-        faker.fake_tag()
+
+    texts = faker.fake_tag_texts(tag_count)
+    tag_ids = {}
+    for i in range(0, len(texts), batch_size):
+        for tag in Tag.get_all(texts[i : i + batch_size]):
+            tag_ids[tag.text] = tag.id
+        db.session.commit()
+    tag_ids = [tag_ids[text] for text in texts]
     print(f"Created {tag_count} tags.")
-    for i in range(snippet_count):
-        faker.fake_snippet()
-    print(f"Created {snippet_count} snippets.")
-    print(f"Committing to database...")
-    faker.commit_all()
+
+    user_ids = range(first_user_id, first_user_id + user_count)
+    counts = faker.snippet_counts(user_count, snippet_count)
+    snippets = faker.fake_snippets(
+        next_id(db, Snippet), user_ids, counts, tag_ids
+    )
+    created = 0
+    while batch := list(islice(snippets, batch_size)):
+        links = [
+            {"snippet_id": snippet["id"], "tag_id": tag_id}
+            for snippet in batch
+            for tag_id in snippet.pop("tag_ids")
+        ]
+        db.session.execute(Snippet.__table__.insert(), batch)
+        if links:
+            db.session.execute(tagged_snippets.insert(), links)
+        db.session.commit()
+        created += len(batch)
+        print(f"Created {created} of {sum(counts)} snippets.")
+    # the links were inserted directly, so the tag counts need catching up
+    TagCount.rebuild()
+    print("Counted tags.")
+
+    if db.engine.dialect.name == "postgresql":
+        # ids were assigned here, so catch the sequences up with them
+        for table in ("users", "snippets"):
+            db.session.execute(
+                db.text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"(SELECT MAX(id) FROM {table}))"
+                )
+            )
+        db.session.commit()
     print("Done.")
@@ -0,0 +1,108 @@
+import csv
+import json
+import time
+from itertools import islice
+from typing import Dict, Iterable, Iterator, Optional, TextIO, Tuple, Union
+
+from app.models import Snippet, User
+
+# a record read from a dump with its line number, or the error that kept
+# the line from being read
+Record = Tuple[int, Union[dict, Exception]]
+
+
+def read_ndjson(file: TextIO) -> Iterator[Record]:
+    """Reads snippets from newline-delimited JSON, as /api/export writes."""
+    for (line_number, line) in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            record = error
+        yield (line_number, record)
+
+
+def read_csv(file: TextIO) -> Iterator[Record]:
+    """Reads snippets from CSV with year, week, text, tags and email columns.
+
+    Tags are comma-separated, as in the edit form. Only year and week are
+    required.
+    """
+    reader = csv.DictReader(file)
+    for row in reader:
+        try:
+            tags = (row.get("tags") or "").split(",")
+            record = {
+                "email": row.get("email") or None,
+                "year": int(row["year"]),
+                "week": int(row["week"]),
+                "text": row.get("text") or "",
+                "tags": [tag.strip() for tag in tags if tag.strip()],
+            }
+        except (KeyError, TypeError, ValueError) as error:
+            record = error
+        yield (reader.line_num, record)
+
+
+def import_snippets(
+    db,
+    records: Iterable[Record],
+    email: Optional[str] = None,
+    batch_size: int = 1000,
+    echo=print,
+) -> int:
+    """Imports snippets in batches of at most batch_size.
+
+    Records without an email belong to the user with the given email.
+    Records that couldn't be read, aren't valid snippets or are for unknown
+    users are skipped, and their line numbers reported. Each batch is
+    written with one upsert and one transaction, and only one batch is held
+    in memory at a time. Returns the number imported.
+    """
+    user_ids: Dict[str, int] = {}
+    imported = 0
+    skipped = 0
+    records = iter(records)
+    start = time.perf_counter()
+    while batch := list(islice(records, batch_size)):
+        valid = []
+        for (line_number, record) in batch:
+            if isinstance(record, Exception):
+                error = str(record)
+            else:
+                error = Snippet.validate_json(record)
+            if error is None:
+                record_email = record.get("email") or email
+                if not isinstance(record_email, str):
+                    error = "no email"
+            if error is not None:
+                echo(f"Skipped line {line_number}: {error}.")
+                skipped += 1
+                continue
+            valid.append((line_number, record_email, record))
+
+        # look up any users not seen in earlier batches with one query
+        missing = {record_email for (_, record_email, _) in valid}
+        missing -= set(user_ids)
+        if missing:
+            users = db.session.query(User.email, User.id)
+            user_ids.update(users.filter(User.email.in_(missing)))
+
+        weeks = []
+        for (line_number, record_email, record) in valid:
+            if (user_id := user_ids.get(record_email)) is None:
+                echo(f"Skipped line {line_number}: unknown user.")
+                skipped += 1
+                continue
+            weeks.append(dict(record, user_id=user_id))
+        Snippet.write_many(weeks)
+        db.session.commit()
+        imported += len(weeks)
+
+        rate = imported / (time.perf_counter() - start)
+        echo(f"Imported {imported} snippets ({rate:.0f} rows/sec).")
+    if skipped:
+        echo(f"Skipped {skipped} invalid snippets.")
+    echo("Done.")
+    return imported
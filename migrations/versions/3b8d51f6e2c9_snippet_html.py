@@ -0,0 +1,55 @@
+"""rendered html column on snippets
+
+Revision ID: 3b8d51f6e2c9
+Revises: e41f7c03b8a6
+Create Date: 2026-10-18 11:20:09.114386
+
+"""
+from alembic import op
+import markdown
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8d51f6e2c9'
+down_revision = 'e41f7c03b8a6'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+snippets = sa.table(
+    'snippets', sa.column('id'), sa.column('text'), sa.column('html')
+)
+
+
+def upgrade():
+    op.add_column('snippets', sa.Column('html', sa.UnicodeText(), nullable=True))
+
+    # render the existing snippets a batch at a time
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(snippets.c.id, snippets.c.text)
+            .where(snippets.c.id > last_id)
+            .order_by(snippets.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        connection.execute(
+            snippets.update()
+            .where(snippets.c.id == sa.bindparam('snippet_id'))
+            .values(html=sa.bindparam('rendered')),
+            [
+                {'snippet_id': id, 'rendered': markdown.markdown(text)}
+                for (id, text) in rows
+            ],
+        )
+        last_id = rows[-1].id
+
+
+def downgrade():
+    with op.batch_alter_table('snippets') as batch_op:
+        batch_op.drop_column('html')
@@ -0,0 +1,34 @@
+"""unique index on tag text
+
+Revision ID: 5e0c2a9d7b41
+Revises: 99ab6fa321dc
+Create Date: 2026-10-18 10:03:17.228450
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0c2a9d7b41'
+down_revision = '99ab6fa321dc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # point links at the oldest tag with the same text, then drop the rest
+    op.execute("""
+        UPDATE tagged_snippets SET tag_id = (
+            SELECT MIN(t.id) FROM tags t JOIN tags u ON t.text = u.text
+            WHERE u.id = tagged_snippets.tag_id
+        )
+    """)
+    op.execute(
+        "DELETE FROM tags WHERE id NOT IN (SELECT MIN(id) FROM tags GROUP BY text)"
+    )
+    op.create_index(op.f('ix_tags_text'), 'tags', ['text'], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_tags_text'), table_name='tags')
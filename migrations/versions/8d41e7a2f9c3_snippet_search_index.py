@@ -0,0 +1,41 @@
+"""full-text search index on snippet text
+
+Revision ID: 8d41e7a2f9c3
+Revises: f6a3b9d2c8e1
+Create Date: 2026-10-18 17:22:05.117642
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41e7a2f9c3'
+down_revision = 'f6a3b9d2c8e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # these mirror SEARCH_INDEX_DDL in app/models.py
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE INDEX ix_snippets_search ON snippets USING gin (to_tsvector('english', text))")
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE snippets_fts USING fts5(text, content='snippets', content_rowid='id', tokenize='porter unicode61')")
+        op.execute("CREATE TRIGGER snippets_fts_insert AFTER INSERT ON snippets BEGIN INSERT INTO snippets_fts(rowid, text) VALUES (new.id, new.text); END")
+        op.execute("CREATE TRIGGER snippets_fts_delete AFTER DELETE ON snippets BEGIN INSERT INTO snippets_fts(snippets_fts, rowid, text) VALUES ('delete', old.id, old.text); END")
+        op.execute("CREATE TRIGGER snippets_fts_update AFTER UPDATE OF text ON snippets BEGIN INSERT INTO snippets_fts(snippets_fts, rowid, text) VALUES ('delete', old.id, old.text); INSERT INTO snippets_fts(rowid, text) VALUES (new.id, new.text); END")
+        # index the snippets written so far
+        op.execute("INSERT INTO snippets_fts(snippets_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX ix_snippets_search")
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER snippets_fts_update")
+        op.execute("DROP TRIGGER snippets_fts_delete")
+        op.execute("DROP TRIGGER snippets_fts_insert")
+        op.execute("DROP TABLE snippets_fts")
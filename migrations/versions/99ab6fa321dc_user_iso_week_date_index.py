@@ -0,0 +1,40 @@
+"""unique index on snippets user and iso week date
+
+Revision ID: 99ab6fa321dc
+Revises: cb478d9080a2
+Create Date: 2026-10-18 09:12:41.503127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '99ab6fa321dc'
+down_revision = 'cb478d9080a2'
+branch_labels = None
+depends_on = None
+
+# snippets superseded by a later snippet for the same user and week
+DUPLICATE_SNIPPETS = """
+    SELECT s.id FROM snippets s WHERE EXISTS (
+        SELECT 1 FROM snippets t
+        WHERE t.user_id = s.user_id
+        AND t.year = s.year
+        AND t.week = s.week
+        AND t.id > s.id
+    )
+"""
+
+
+def upgrade():
+    # keep only the most recently written snippet for each week
+    op.execute(
+        f"DELETE FROM tagged_snippets WHERE snippet_id IN ({DUPLICATE_SNIPPETS})"
+    )
+    op.execute(f"DELETE FROM snippets WHERE id IN ({DUPLICATE_SNIPPETS})")
+    op.create_index('user_iso_week_date', 'snippets', ['user_id', 'year', 'week'], unique=True)
+
+
+def downgrade():
+    op.drop_index('user_iso_week_date', table_name='snippets')
@@ -0,0 +1,28 @@
+"""remove blank tags
+
+Revision ID: a3c6e8f0b2d4
+Revises: f2b7c9e1a4d6
+Create Date: 2026-10-18 22:31:08.915264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c6e8f0b2d4'
+down_revision = 'f2b7c9e1a4d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # saving the edit form without tags used to tag the snippet with ''
+    blank = "SELECT id FROM tags WHERE trim(text) = ''"
+    op.execute(f'DELETE FROM tagged_snippets WHERE tag_id IN ({blank})')
+    op.execute(f'DELETE FROM tag_counts WHERE tag_id IN ({blank})')
+    op.execute("DELETE FROM tags WHERE trim(text) = ''")
+
+
+def downgrade():
+    pass
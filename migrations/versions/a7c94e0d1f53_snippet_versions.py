@@ -0,0 +1,31 @@
+"""version and updated_at columns on snippets
+
+Revision ID: a7c94e0d1f53
+Revises: 3b8d51f6e2c9
+Create Date: 2026-10-18 12:02:48.630952
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c94e0d1f53'
+down_revision = '3b8d51f6e2c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('snippets', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    # SQLite can't add a column with a non-constant default, so backfill it
+    op.add_column('snippets', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE snippets SET updated_at = CURRENT_TIMESTAMP")
+    with op.batch_alter_table('snippets') as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('snippets') as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('version')
@@ -0,0 +1,53 @@
+"""full-text search index by user
+
+Revision ID: c7e1a9d4b6f2
+Revises: a3c6e8f0b2d4
+Create Date: 2026-10-18 23:12:47.306518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e1a9d4b6f2'
+down_revision = 'a3c6e8f0b2d4'
+branch_labels = None
+depends_on = None
+
+
+def drop_sqlite_index():
+    op.execute("DROP TRIGGER snippets_fts_update")
+    op.execute("DROP TRIGGER snippets_fts_delete")
+    op.execute("DROP TRIGGER snippets_fts_insert")
+    op.execute("DROP TABLE snippets_fts")
+
+
+def upgrade():
+    # these mirror SEARCH_INDEX_DDL in app/models.py
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+        op.execute("DROP INDEX ix_snippets_search")
+        op.execute("CREATE INDEX ix_snippets_search ON snippets USING gin (user_id, to_tsvector('english', text))")
+    elif dialect == 'sqlite':
+        drop_sqlite_index()
+        op.execute("CREATE VIRTUAL TABLE snippets_fts USING fts5(user_id, text, content='snippets', content_rowid='id', tokenize='porter unicode61')")
+        op.execute("CREATE TRIGGER snippets_fts_insert AFTER INSERT ON snippets BEGIN INSERT INTO snippets_fts(rowid, user_id, text) VALUES (new.id, new.user_id, new.text); END")
+        op.execute("CREATE TRIGGER snippets_fts_delete AFTER DELETE ON snippets BEGIN INSERT INTO snippets_fts(snippets_fts, rowid, user_id, text) VALUES ('delete', old.id, old.user_id, old.text); END")
+        op.execute("CREATE TRIGGER snippets_fts_update AFTER UPDATE OF user_id, text ON snippets BEGIN INSERT INTO snippets_fts(snippets_fts, rowid, user_id, text) VALUES ('delete', old.id, old.user_id, old.text); INSERT INTO snippets_fts(rowid, user_id, text) VALUES (new.id, new.user_id, new.text); END")
+        op.execute("INSERT INTO snippets_fts(snippets_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX ix_snippets_search")
+        op.execute("CREATE INDEX ix_snippets_search ON snippets USING gin (to_tsvector('english', text))")
+    elif dialect == 'sqlite':
+        drop_sqlite_index()
+        op.execute("CREATE VIRTUAL TABLE snippets_fts USING fts5(text, content='snippets', content_rowid='id', tokenize='porter unicode61')")
+        op.execute("CREATE TRIGGER snippets_fts_insert AFTER INSERT ON snippets BEGIN INSERT INTO snippets_fts(rowid, text) VALUES (new.id, new.text); END")
+        op.execute("CREATE TRIGGER snippets_fts_delete AFTER DELETE ON snippets BEGIN INSERT INTO snippets_fts(snippets_fts, rowid, text) VALUES ('delete', old.id, old.text); END")
+        op.execute("CREATE TRIGGER snippets_fts_update AFTER UPDATE OF text ON snippets BEGIN INSERT INTO snippets_fts(snippets_fts, rowid, text) VALUES ('delete', old.id, old.text); INSERT INTO snippets_fts(rowid, text) VALUES (new.id, new.text); END")
+        op.execute("INSERT INTO snippets_fts(snippets_fts) VALUES ('rebuild')")
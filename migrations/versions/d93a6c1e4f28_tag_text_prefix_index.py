@@ -0,0 +1,27 @@
+"""prefix index on tag text
+
+Revision ID: d93a6c1e4f28
+Revises: b5e2f8c4a9d7
+Create Date: 2026-10-18 19:12:47.308455
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93a6c1e4f28'
+down_revision = 'b5e2f8c4a9d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # this mirrors the tags DDL in app/models.py
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE INDEX ix_tags_text_prefix ON tags (lower(text) text_pattern_ops)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX ix_tags_text_prefix')
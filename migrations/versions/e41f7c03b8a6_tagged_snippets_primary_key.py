@@ -0,0 +1,52 @@
+"""primary key and tag index on tagged_snippets
+
+Revision ID: e41f7c03b8a6
+Revises: 5e0c2a9d7b41
+Create Date: 2026-10-18 10:41:55.870214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41f7c03b8a6'
+down_revision = '5e0c2a9d7b41'
+branch_labels = None
+depends_on = None
+
+
+def copy_links(primary_key):
+    """Replaces tagged_snippets with a copy of its distinct, non-null links.
+
+    SQLite can't add a primary key to an existing table, so the table is
+    rebuilt on every database.
+    """
+    constraints = [
+        sa.ForeignKeyConstraint(['snippet_id'], ['snippets.id'], ),
+        sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ),
+    ]
+    if primary_key:
+        constraints.append(sa.PrimaryKeyConstraint('snippet_id', 'tag_id', name='tagged_snippets_pkey'))
+    op.create_table('tagged_snippets_new',
+    sa.Column('snippet_id', sa.Integer(), nullable=not primary_key),
+    sa.Column('tag_id', sa.Integer(), nullable=not primary_key),
+    *constraints
+    )
+    op.execute("""
+        INSERT INTO tagged_snippets_new (snippet_id, tag_id)
+        SELECT DISTINCT snippet_id, tag_id FROM tagged_snippets
+        WHERE snippet_id IS NOT NULL AND tag_id IS NOT NULL
+    """)
+    op.drop_table('tagged_snippets')
+    op.rename_table('tagged_snippets_new', 'tagged_snippets')
+
+
+def upgrade():
+    copy_links(primary_key=True)
+    op.create_index('tag_snippets', 'tagged_snippets', ['tag_id', 'snippet_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('tag_snippets', table_name='tagged_snippets')
+    copy_links(primary_key=False)
@@ -0,0 +1,34 @@
+"""templates and contexts of queued email
+
+Revision ID: f6a3b9d2c8e1
+Revises: c2d8f5a1b7e4
+Create Date: 2026-10-18 16:41:37.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6a3b9d2c8e1'
+down_revision = 'c2d8f5a1b7e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('outbox') as batch_op:
+        batch_op.add_column(sa.Column('template', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('context', sa.UnicodeText(), nullable=True))
+        batch_op.add_column(sa.Column('base_url', sa.String(length=255), nullable=True))
+        # bodies are rendered when the email is sent
+        batch_op.alter_column('body', existing_type=sa.UnicodeText(), nullable=True)
+
+
+def downgrade():
+    op.execute("UPDATE outbox SET body = '' WHERE body IS NULL")
+    with op.batch_alter_table('outbox') as batch_op:
+        batch_op.alter_column('body', existing_type=sa.UnicodeText(), nullable=False)
+        batch_op.drop_column('base_url')
+        batch_op.drop_column('context')
+        batch_op.drop_column('template')
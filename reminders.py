@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Optional, Tuple
+
+from flask import Flask, current_app
+
+from app.email import CLAIM_LEASE, deliver, queue_email
+from app.models import User
+from core.date_utils import this_week
+
+
+def remind_batch(app: Flask, db, users, year: int, week: int) -> int:
+    """Queues and sends reminders to a batch of users. Returns the number sent.
+
+    Reminders are queued in chunks the size of the mail queue's batches, and
+    each chunk is claimed just before it's sent, so its claim can't run out
+    while it waits.
+    """
+    week_begin = date.fromisocalendar(year, week, 1).isoformat()
+    with app.app_context():
+        chunk_size = app.config["LASTWEEK_MAIL_BATCH_SIZE"]
+        sent = 0
+        for i in range(0, len(users), chunk_size):
+            messages = [
+                queue_email(
+                    email,
+                    "What did you do this week?",
+                    "email/reminder",
+                    name=name,
+                    year=year,
+                    week=week,
+                    week_begin=week_begin,
+                )
+                for (_, email, name) in users[i : i + chunk_size]
+            ]
+            # claimed already, so the mail queue leaves them to us
+            lease = datetime.utcnow() + CLAIM_LEASE
+            for message in messages:
+                (message.attempts, message.next_attempt_at) = (1, lease)
+            db.session.add_all(messages)
+            db.session.flush()
+            ids = [message.id for message in messages]
+            db.session.commit()
+            sent += deliver(ids)
+        return sent
+
+
+def send_reminders(
+    db,
+    iso_week: Optional[Tuple[int, int]] = None,
+    batch_size: int = 1000,
+    workers: int = 4,
+    after_id: int = 0,
+    echo=print,
+) -> int:
+    """Reminds confirmed users without a snippet for the week to write one.
+
+    The week is this week by default. Users are found in batches of at most
+    batch_size, ordered by id, starting after after_id, so an interrupted
+    run can be resumed from the last user it reports done. Each batch is
+    queued in the outbox and sent by one of the workers, while the next
+    batches are found. Reminders that fail are left for the mail queue to
+    retry. Returns the number sent.
+    """
+    (year, week) = iso_week or this_week()
+    app = current_app._get_current_object()
+    users = User.missing_week(year, week)
+    # at most two batches per worker wait to be sent
+    slots = threading.BoundedSemaphore(2 * workers)
+    pending = deque()
+    (found, sent, done_id) = (0, 0, after_id)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers, thread_name_prefix="reminders") as pool:
+        while batch := users.filter(User.id > after_id)[:batch_size]:
+            slots.acquire()
+            future = pool.submit(remind_batch, app, db, batch, year, week)
+            future.add_done_callback(lambda _: slots.release())
+            found += len(batch)
+            after_id = batch[-1].id
+            pending.append((after_id, future))
+            # batches finish out of order, so only report the users before
+            # the first unfinished one as done
+            while pending and pending[0][1].done():
+                (done_id, done) = pending.popleft()
+                sent += done.result()
+            rate = found / (time.perf_counter() - start)
+            echo(
+                f"Found {found} users to remind, done up to user {done_id} "
+                f"({rate:.0f} users/sec)."
+            )
+        sent += sum(future.result() for (_, future) in pending)
+
+    elapsed = time.perf_counter() - start
+    echo(
+        f"Sent {sent} of {found} reminders for {year}-W{week:02} in "
+        f"{elapsed:.1f}s ({sent / elapsed:.0f} emails/sec)."
+    )
+    if sent < found:
+        echo(f"{found - sent} failed, and will be retried by the mail queue.")
+    return sent
@@ -1,5 +1,6 @@
 from datetime import date
 from base64 import b64encode
+import gzip
 import json
 import unittest
 
@@ -312,3 +313,229 @@ class APITest(unittest.TestCase):
         self.assertSetEqual(
             {(2017, 9), (2011, 18)}, year_weeks(resp.json["weeks"])
         )
+
+    def test_get_weeks_cursor_pagination(self):
+        self.app.config["LASTWEEK_SNIPPETS_PER_PAGE"] = 2
+        Snippet.update(self.user.id, 2017, 9, "foo", ["blue", "red"])
+        Snippet.update(self.user.id, 2011, 18, "bar", ["green"])
+        Snippet.update(self.user.id, 2007, 29, "baz", [])
+
+        year_week = lambda snippet: (snippet["year"], snippet["week"])
+        year_weeks = lambda weeks: [year_week(snippet) for snippet in weeks]
+
+        # first page
+        resp = self.get("/api/weeks/?cursor=", self.valid_api_headers())
+        self.assertNotIn("count", resp.json)
+        self.assertIsNone(resp.json["prev_url"])
+        self.assertIsNotNone(resp.json["next_url"])
+        self.assertListEqual(
+            [(2017, 9), (2011, 18)], year_weeks(resp.json["weeks"])
+        )
+
+        # use link to go to the second page
+        resp = self.get(resp.json["next_url"], self.valid_api_headers())
+        self.assertIsNotNone(resp.json["prev_url"])
+        self.assertIsNone(resp.json["next_url"])
+        self.assertListEqual([(2007, 29)], year_weeks(resp.json["weeks"]))
+
+        # use link to go back to the first page
+        resp = self.get(resp.json["prev_url"], self.valid_api_headers())
+        self.assertIsNone(resp.json["prev_cursor"])
+        self.assertIsNotNone(resp.json["next_cursor"])
+        self.assertListEqual(
+            [(2017, 9), (2011, 18)], year_weeks(resp.json["weeks"])
+        )
+
+    def test_get_weeks_cursor_count(self):
+        Snippet.update(self.user.id, 2017, 9, "foo", ["blue", "red"])
+        Snippet.update(self.user.id, 2011, 18, "bar", ["green"])
+        resp = self.get(
+            "/api/weeks/?cursor=&count=true&tag=blue",
+            self.valid_api_headers(),
+        )
+        self.assertEqual(1, resp.json["count"])
+        weeks = resp.json["weeks"]
+        self.assertListEqual(
+            [(2017, 9)],
+            [(snippet["year"], snippet["week"]) for snippet in weeks],
+        )
+
+    def test_get_weeks_invalid_cursor(self):
+        resp = self.get("/api/weeks/?cursor=foo", self.valid_api_headers())
+        self.assertEqual(400, resp.status_code)
+
+    def test_get_week_not_modified(self):
+        Snippet.update(self.user.id, 2017, 9, "foo", ["blue", "red"])
+        resp = self.get("/api/weeks/2017/9", self.valid_api_headers())
+        self.assertEqual(200, resp.status_code)
+        etag = resp.headers["ETag"]
+        self.assertIsNotNone(resp.headers.get("Last-Modified"))
+
+        headers = self.valid_api_headers()
+        headers["If-None-Match"] = etag
+        resp = self.get("/api/weeks/2017/9", headers)
+        self.assertEqual(304, resp.status_code)
+
+        # a new version is sent in full
+        Snippet.update(self.user.id, 2017, 9, "bar", ["blue", "red"])
+        resp = self.get("/api/weeks/2017/9", headers)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual("bar", resp.json["text"])
+
+    def test_get_weeks_not_modified(self):
+        Snippet.update(self.user.id, 2017, 9, "foo", ["blue", "red"])
+        resp = self.get("/api/weeks/", self.valid_api_headers())
+        self.assertEqual(200, resp.status_code)
+
+        headers = self.valid_api_headers()
+        headers["If-None-Match"] = resp.headers["ETag"]
+        resp = self.get("/api/weeks/", headers)
+        self.assertEqual(304, resp.status_code)
+
+        Snippet.update(self.user.id, 2011, 18, "bar", ["green"])
+        resp = self.get("/api/weeks/", headers)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(2, resp.json["count"])
+
+    def test_update_week_if_match(self):
+        resp = self.get("/api/weeks/2017/9", self.valid_api_headers())
+        headers = self.valid_api_headers()
+        headers["If-Match"] = resp.headers["ETag"]
+
+        # the first write creates the week
+        json = {"text": "foo", "tags": ["blue"]}
+        resp = self.post("/api/weeks/2017/9", headers, json)
+        self.assertEqual(200, resp.status_code)
+        etag = resp.headers["ETag"]
+
+        # a write based on the old version fails
+        json = {"text": "bar", "tags": ["red"]}
+        resp = self.post("/api/weeks/2017/9", headers, json)
+        self.assertEqual(412, resp.status_code)
+        snippet = Snippet.get_by_week(self.user.id, 2017, 9)
+        self.assertEqual("foo", snippet.text)
+        self.assertSetEqual({"blue"}, {tag.text for tag in snippet.tags})
+
+        # a write based on the current version succeeds
+        headers["If-Match"] = etag
+        resp = self.post("/api/weeks/2017/9", headers, json)
+        self.assertEqual(200, resp.status_code)
+        self.assertNotEqual(etag, resp.headers["ETag"])
+        snippet = Snippet.get_by_week(self.user.id, 2017, 9)
+        self.assertEqual("bar", snippet.text)
+
+    def test_update_missing_week_if_match(self):
+        headers = self.valid_api_headers()
+        headers["If-Match"] = '"1"'
+        json = {"text": "foo", "tags": ["blue"]}
+        resp = self.post("/api/weeks/2017/9", headers, json)
+        self.assertEqual(412, resp.status_code)
+        self.assertIsNone(Snippet.get_by_week(self.user.id, 2017, 9))
+
+    def test_update_weeks(self):
+        Snippet.update(self.user.id, 2017, 9, "foo", ["blue", "red"])
+        json = [
+            {"year": 2017, "week": 9, "text": "bar", "tags": ["green"]},
+            {"year": 2011, "week": 18, "text": "baz", "tags": ["green"]},
+            {"year": 2011, "week": 53, "text": "qux"},
+            "quux",
+        ]
+        resp = self.post("/api/weeks/", self.valid_api_headers(), json)
+        self.assertEqual(200, resp.status_code)
+        results = resp.json["weeks"]
+        self.assertListEqual(
+            [True, True, False, False],
+            [result["success"] for result in results],
+        )
+        self.assertEqual("/api/weeks/2011/18", results[1]["url"])
+        self.assertEqual(53, results[2]["week"])
+
+        updated = Snippet.get_by_week(self.user.id, 2017, 9)
+        self.assertEqual("bar", updated.text)
+        self.assertSetEqual({"green"}, {tag.text for tag in updated.tags})
+        created = Snippet.get_by_week(self.user.id, 2011, 18)
+        self.assertEqual("baz", created.text)
+        self.assertSetEqual({"green"}, {tag.text for tag in created.tags})
+        self.assertEqual(2, Snippet.get_all(self.user.id).count())
+
+    def test_update_weeks_invalid(self):
+        json = {"year": 2017, "week": 9, "text": "bar"}
+        resp = self.post("/api/weeks/", self.valid_api_headers(), json)
+        self.assertEqual(400, resp.status_code)
+
+    def test_export(self):
+        Snippet.update(self.user.id, 2017, 9, "foo", ["blue", "red"])
+        Snippet.update(self.user.id, 2011, 18, "bar", ["green"])
+        resp = self.get("/api/export", self.valid_api_headers())
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual("application/x-ndjson", resp.mimetype)
+        weeks = [json.loads(line) for line in resp.data.splitlines()]
+        self.assertListEqual(
+            [(2011, 18, "bar"), (2017, 9, "foo")],
+            [(week["year"], week["week"], week["text"]) for week in weeks],
+        )
+        self.assertSetEqual({"blue", "red"}, set(weeks[1]["tags"]))
+
+    def test_export_since(self):
+        Snippet.update(self.user.id, 2017, 9, "foo", ["blue", "red"])
+        Snippet.update(self.user.id, 2011, 18, "bar", ["green"])
+        resp = self.get("/api/export?since=2017-W09", self.valid_api_headers())
+        weeks = [json.loads(line) for line in resp.data.splitlines()]
+        self.assertListEqual(
+            [(2017, 9)], [(w["year"], w["week"]) for w in weeks]
+        )
+        resp = self.get("/api/export?since=2017-09", self.valid_api_headers())
+        self.assertEqual(400, resp.status_code)
+
+    def test_export_gzip(self):
+        Snippet.update(self.user.id, 2017, 9, "foo", ["blue", "red"])
+        headers = self.valid_api_headers()
+        headers["Accept-Encoding"] = "gzip"
+        resp = self.get("/api/export", headers)
+        self.assertEqual("gzip", resp.headers["Content-Encoding"])
+        weeks = [
+            json.loads(line)
+            for line in gzip.decompress(resp.data).splitlines()
+        ]
+        self.assertEqual("foo", weeks[0]["text"])
+
+    def test_search(self):
+        Snippet.update(self.user.id, 2017, 9, "fixed the <parser>", ["blue"])
+        Snippet.update(self.user.id, 2017, 10, "parser parser parser", [])
+        Snippet.update(self.user.id, 2017, 11, "went on holiday", [])
+        resp = self.get("/api/search?q=parser", self.valid_api_headers())
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(2, resp.json["count"])
+        weeks = resp.json["weeks"]
+        self.assertListEqual([10, 9], [week["week"] for week in weeks])
+        self.assertListEqual(["blue"], weeks[1]["tags"])
+        self.assertEqual(
+            "fixed the &lt;<mark>parser</mark>&gt;", weeks[1]["highlight"]
+        )
+
+    def test_get_tags(self):
+        Snippet.update(self.user.id, 2017, 9, "foo", ["blue", "red"])
+        Snippet.update(self.user.id, 2017, 10, "bar", ["red"])
+        resp = self.get("/api/tags", self.valid_api_headers())
+        self.assertEqual(200, resp.status_code)
+        self.assertListEqual(
+            [{"text": "red", "count": 2}, {"text": "blue", "count": 1}],
+            resp.json["tags"],
+        )
+
+    def test_complete_tags(self):
+        Snippet.update(self.user.id, 2017, 9, "foo", ["blue", "black"])
+        Snippet.update(self.user.id, 2017, 10, "bar", ["black"])
+        headers = self.valid_api_headers()
+        resp = self.get("/api/tags/complete?prefix=b", headers)
+        self.assertEqual(200, resp.status_code)
+        self.assertListEqual(
+            [{"text": "black", "count": 2}, {"text": "blue", "count": 1}],
+            resp.json["tags"],
+        )
+        resp = self.get("/api/tags/complete?prefix=b&limit=0", headers)
+        self.assertEqual(400, resp.status_code)
+
+    def test_search_no_words(self):
+        resp = self.get("/api/search?q=%22*%22", self.valid_api_headers())
+        self.assertEqual(400, resp.status_code)
@@ -0,0 +1,50 @@
+from contextlib import redirect_stdout
+from io import StringIO
+import unittest
+
+from benchmark import compare, run_benchmarks
+
+
+def make_results(**metrics):
+    return {"scales": {"small": {"api_weeks": metrics}}}
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_run_benchmarks(self):
+        scales = {"tiny": dict(user_count=2, tag_count=5, snippet_count=20)}
+        with redirect_stdout(StringIO()):
+            results = run_benchmarks(scales, iterations=3)
+        tiny = results["scales"]["tiny"]
+        self.assertSetEqual(
+            {"api_weeks", "api_week_get", "api_week_put", "history", "edit"},
+            set(tiny),
+        )
+        for metrics in tiny.values():
+            self.assertGreater(metrics["p99_ms"], 0)
+            self.assertGreater(metrics["queries"], 0)
+            self.assertGreater(metrics["peak_alloc_kib"], 0)
+
+    def test_compare_latency(self):
+        baseline = make_results(p50_ms=10, p99_ms=20)
+        self.assertListEqual(
+            [], compare(baseline, make_results(p50_ms=11, p99_ms=23))
+        )
+        self.assertListEqual(
+            ["small/api_weeks: p99_ms went from 20 to 25"],
+            compare(baseline, make_results(p50_ms=10, p99_ms=25)),
+        )
+        self.assertListEqual(
+            [], compare(baseline, make_results(p50_ms=10, p99_ms=25), 0.5)
+        )
+
+    def test_compare_queries(self):
+        baseline = make_results(queries=4)
+        self.assertListEqual([], compare(baseline, make_results(queries=3)))
+        self.assertListEqual(
+            ["small/api_weeks: queries went from 4 to 5"],
+            compare(baseline, make_results(queries=5)),
+        )
+
+    def test_compare_new_benchmark(self):
+        results = make_results(queries=4)
+        self.assertListEqual([], compare({"scales": {}}, results))
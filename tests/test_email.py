@@ -0,0 +1,192 @@
+from datetime import datetime, timedelta
+from os import path
+import smtplib
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from flask_mail import Connection
+
+from app import create_app, db, mail
+from app.email import CLAIM_LEASE, MailQueue, send_email
+from app.models import OutboxMessage, User
+
+
+class EmailTest(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.queue = self.app.extensions["mail_queue"]
+        self.user = User(
+            email="julius.caesar@example.com",
+            name="Julius Caesar",
+            password="rubicon",
+            member_since=datetime.today(),
+        )
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def send(self):
+        send_email(
+            self.user.email,
+            "Confirm your account",
+            "auth/email/confirm",
+            user={"name": self.user.name},
+            token="token",
+        )
+
+    def test_send_email_is_queued(self):
+        with mail.record_messages() as outbox:
+            self.send()
+            self.assertListEqual([], outbox)
+            self.assertEqual(1, OutboxMessage.query.count())
+            self.assertEqual(1, self.queue.flush())
+        self.assertEqual(1, len(outbox))
+        self.assertListEqual([self.user.email], outbox[0].recipients)
+        self.assertEqual("[lastweek] Confirm your account", outbox[0].subject)
+        self.assertIn(
+            "http://lastweek-test.localdomain/auth/confirm/token",
+            outbox[0].body,
+        )
+        self.assertIn("Dear Julius Caesar", outbox[0].html)
+        message = OutboxMessage.query.one()
+        self.assertIsNotNone(message.sent_at)
+        self.assertEqual(1, message.attempts)
+        self.assertEqual(0, self.queue.flush())
+
+    def test_rendered_when_sent(self):
+        self.send()
+        message = OutboxMessage.query.one()
+        self.assertEqual("auth/email/confirm", message.template)
+        self.assertIsNone(message.body)
+        self.queue.flush()
+        self.assertIn("Welcome to lastweek!", message.body)
+
+    def test_base_url_of_request(self):
+        self.app.config["LASTWEEK_BASE_URL"] = None
+        self.app.config["SERVER_NAME"] = None
+        with self.app.test_request_context(base_url="https://example.com/"):
+            self.send()
+        with mail.record_messages() as outbox:
+            self.queue.flush()
+        self.assertIn("https://example.com/auth/confirm/token", outbox[0].body)
+
+    def test_bad_message_doesnt_fail_batch(self):
+        for _ in range(3):
+            self.send()
+        send_email(self.user.email, "Oops", "email/missing")
+        with mail.record_messages() as outbox:
+            self.assertEqual(3, self.queue.flush())
+        self.assertEqual(3, len(outbox))
+        bad = OutboxMessage.query.filter_by(template="email/missing").one()
+        self.assertIsNone(bad.sent_at)
+        self.assertEqual(1, bad.attempts)
+        self.assertIn("TemplateNotFound", bad.last_error)
+        self.assertIsNotNone(bad.next_attempt_at)
+        sent = OutboxMessage.query.filter(OutboxMessage.sent_at != None)
+        self.assertEqual(3, sent.count())
+
+    def test_disconnect_keeps_sent_marks(self):
+        for _ in range(10):
+            self.send()
+        calls = []
+
+        def send(message):
+            calls.append(message)
+            if len(calls) > 5:
+                raise smtplib.SMTPServerDisconnected("gone")
+
+        with mock.patch.object(Connection, "send", side_effect=send):
+            self.assertEqual(5, self.queue.flush())
+        sent = OutboxMessage.query.filter(OutboxMessage.sent_at != None)
+        self.assertEqual(5, sent.count())
+        failed = OutboxMessage.query.filter(OutboxMessage.sent_at == None)
+        self.assertEqual(5, failed.count())
+        for message in failed:
+            self.assertIn("SMTPServerDisconnected", message.last_error)
+
+    def test_templates_are_compiled(self):
+        templates = self.app.extensions["email_templates"].templates
+        self.assertIn("auth/email/confirm.txt.j2", templates)
+        self.assertIn("auth/email/reset.html.j2", templates)
+        self.assertNotIn("history.html.j2", templates)
+
+    def test_flush_sends_every_batch(self):
+        for _ in range(5):
+            self.send()
+        self.queue.batch_size = 2
+        with mail.record_messages() as outbox:
+            self.assertEqual(5, self.queue.flush())
+        self.assertEqual(5, len(outbox))
+
+    def test_claimed_messages_are_skipped(self):
+        self.send()
+        self.assertEqual(1, len(OutboxMessage.claim_due(10, CLAIM_LEASE)))
+        self.assertListEqual([], OutboxMessage.claim_due(10, CLAIM_LEASE))
+
+    def test_failed_delivery_is_retried(self):
+        state = self.app.extensions["mail"]
+        (state.suppress, state.use_tls) = (False, False)
+        (state.server, state.port) = ("localhost", 1)
+        self.app.config["LASTWEEK_MAIL_MAX_ATTEMPTS"] = 2
+        self.send()
+        self.assertEqual(0, self.queue.flush())
+        message = OutboxMessage.query.one()
+        self.assertIsNone(message.sent_at)
+        self.assertIn("ConnectionRefusedError", message.last_error)
+        retry_at = datetime.utcnow() + timedelta(seconds=60)
+        self.assertAlmostEqual(
+            retry_at, message.next_attempt_at, delta=timedelta(seconds=5)
+        )
+
+        # the second attempt is the last
+        message.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        self.assertEqual(0, self.queue.flush())
+        message = OutboxMessage.query.one()
+        self.assertEqual(2, message.attempts)
+        self.assertIsNone(message.next_attempt_at)
+
+
+class MailQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.TemporaryDirectory()
+        self.app = create_app("testing")
+        # worker threads need to share the database
+        database = path.join(self.data_dir.name, "test.sqlite")
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + database
+        self.app.config["LASTWEEK_MAIL_WORKERS"] = 2
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.get_engine(self.app).dispose()
+        self.app_context.pop()
+        self.data_dir.cleanup()
+
+    def test_workers_send_queued_email(self):
+        queue = MailQueue(self.app)
+        self.app.extensions["mail_queue"] = queue
+        user = User(email="julius.caesar@example.com", name="Julius Caesar")
+        with mail.record_messages() as outbox:
+            for _ in range(3):
+                send_email(
+                    user.email,
+                    "Reset your password",
+                    "auth/email/reset",
+                    user={"name": user.name},
+                    token="token",
+                )
+            deadline = time.monotonic() + 5
+            while len(outbox) < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(3, len(outbox))
@@ -0,0 +1,71 @@
+from contextlib import redirect_stdout
+from datetime import date
+from io import StringIO
+import unittest
+
+from app import create_app, db
+from app.models import Snippet, Tag, User
+from fill_db import LAST_WEEK, LastweekFaker, fill_db
+
+
+class FillDbTest(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_snippet_counts(self):
+        faker = LastweekFaker(seed=1)
+        counts = faker.snippet_counts(10, 1000)
+        self.assertEqual(1000, sum(counts))
+        counts = faker.snippet_counts(2, 10 ** 6)
+        self.assertListEqual([len(faker.weeks)] * 2, counts)
+
+    def test_weeks_are_fixed(self):
+        self.assertEqual(LAST_WEEK, LastweekFaker(seed=1).weeks[-1])
+        faker = LastweekFaker(seed=1, last_week=date(2021, 4, 21))
+        self.assertEqual(date(2021, 4, 19), faker.weeks[-1])
+
+    def test_distributions_are_configurable(self):
+        faker = LastweekFaker(seed=1, text_mu=0, text_sigma=0)
+        self.assertIn(faker.fake_text(), faker.sentences)
+        counts = LastweekFaker(seed=1, user_skew=100).snippet_counts(4, 400)
+        self.assertTrue(all(90 <= count <= 110 for count in counts))
+
+    def test_seeded_data_is_reproducible(self):
+        (first, second) = (LastweekFaker(seed=1), LastweekFaker(seed=1))
+        self.assertListEqual(
+            first.fake_tag_texts(50), second.fake_tag_texts(50)
+        )
+        for (a, b) in zip(
+            first.fake_snippets(1, [1, 2], [5, 5], [1, 2, 3]),
+            second.fake_snippets(1, [1, 2], [5, 5], [1, 2, 3]),
+        ):
+            del a["updated_at"], b["updated_at"]
+            self.assertDictEqual(a, b)
+
+    def test_fill_db(self):
+        with redirect_stdout(StringIO()):
+            fill_db(
+                db,
+                user_count=5,
+                tag_count=20,
+                snippet_count=300,
+                seed=1,
+                batch_size=64,
+            )
+        self.assertEqual(5, User.query.count())
+        self.assertEqual(20, Tag.query.count())
+        self.assertEqual(300, Snippet.query.count())
+        weeks = db.session.query(
+            Snippet.user_id, Snippet.year, Snippet.week
+        ).distinct()
+        self.assertEqual(300, weeks.count())
+        user = User.query.first()
+        self.assertTrue(user.verify_password("p@ssw0rd"))
@@ -0,0 +1,116 @@
+from datetime import date
+from io import StringIO
+import unittest
+
+from app import create_app, db
+from app.models import Snippet, TagCount, User
+from import_snippets import import_snippets, read_csv, read_ndjson
+
+
+class ImportSnippetsTest(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.user = User(
+            email="julius.caesar@example.com",
+            name="Julius Caesar",
+            password="rubicon",
+            confirmed=True,
+            member_since=date.today(),
+        )
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_import_ndjson(self):
+        dump = StringIO(
+            '{"year": 2017, "week": 9, "text": "foo", "tags": ["blue"]}\n'
+            '{"year": 2017, "week": 10, "text": "bar"}\n'
+            "\n"
+            '{"year": 2017, "week": 60, "text": "baz"}\n'
+        )
+        imported = import_snippets(
+            db,
+            read_ndjson(dump),
+            self.user.email,
+            batch_size=2,
+            echo=lambda _: None,
+        )
+        self.assertEqual(2, imported)
+        snippet = Snippet.get_by_week(self.user.id, 2017, 9)
+        self.assertEqual("foo", snippet.text)
+        self.assertSetEqual({"blue"}, {tag.text for tag in snippet.tags})
+        self.assertIsNotNone(Snippet.get_by_week(self.user.id, 2017, 10))
+
+    def test_import_csv(self):
+        dump = StringIO(
+            "email,year,week,text,tags\n"
+            'julius.caesar@example.com,2017,9,"foo, bar","blue, red"\n'
+            "nobody@example.com,2017,10,baz,\n"
+        )
+        imported = import_snippets(db, read_csv(dump), echo=lambda _: None)
+        self.assertEqual(1, imported)
+        snippet = Snippet.get_by_week(self.user.id, 2017, 9)
+        self.assertEqual("foo, bar", snippet.text)
+        self.assertSetEqual(
+            {"blue", "red"}, {tag.text for tag in snippet.tags}
+        )
+
+    def test_bad_records_are_skipped(self):
+        dump = StringIO(
+            '{"year": 2017, "week": 9, "text": "foo"}\n'
+            '["not", "a", "snippet"]\n'
+            '{"year": 2017, "week": 10, "te\n'
+            '{"year": 2017, "week": 11, "text": "bar"}\n'
+        )
+        messages = []
+        imported = import_snippets(
+            db, read_ndjson(dump), self.user.email, echo=messages.append
+        )
+        self.assertEqual(2, imported)
+        self.assertTrue(messages[0].startswith("Skipped line 2:"))
+        self.assertTrue(messages[1].startswith("Skipped line 3:"))
+        self.assertIn("Skipped 2 invalid snippets.", messages)
+
+    def test_bad_csv_rows_are_skipped(self):
+        dump = StringIO(
+            "email,year,week,text\n"
+            "julius.caesar@example.com,abc,9,foo\n"
+            "julius.caesar@example.com,2017\n"
+            "julius.caesar@example.com,2017,10,bar\n"
+        )
+        messages = []
+        imported = import_snippets(db, read_csv(dump), echo=messages.append)
+        self.assertEqual(1, imported)
+        self.assertTrue(messages[0].startswith("Skipped line 2:"))
+        self.assertTrue(messages[1].startswith("Skipped line 3:"))
+
+    def test_batches_mix_users(self):
+        other = User(
+            email="marcus.brutus@example.com",
+            name="Marcus Brutus",
+            password="ides",
+            confirmed=True,
+            member_since=date.today(),
+        )
+        db.session.add(other)
+        db.session.commit()
+        dump = StringIO(
+            "email,year,week,text,tags\n"
+            "julius.caesar@example.com,2017,9,foo,blue\n"
+            "marcus.brutus@example.com,2017,9,bar,blue\n"
+            "julius.caesar@example.com,2017,10,baz,red\n"
+        )
+        imported = import_snippets(db, read_csv(dump), echo=lambda _: None)
+        self.assertEqual(3, imported)
+        self.assertEqual("bar", Snippet.get_by_week(other.id, 2017, 9).text)
+        self.assertEqual(
+            [("blue", 1), ("red", 1)], TagCount.get_all(self.user.id)
+        )
+        self.assertEqual([("blue", 1)], TagCount.get_all(other.id))
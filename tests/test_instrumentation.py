@@ -0,0 +1,65 @@
+from datetime import date
+import unittest
+
+from app import create_app, db, instrumentation
+from app.models import User
+
+
+class InstrumentationTest(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app.config["LASTWEEK_SQL_INSTRUMENTATION"] = True
+        self.app.config["LASTWEEK_N_PLUS_ONE_THRESHOLD"] = 3
+        instrumentation.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        for i in range(3):
+            db.session.add(
+                User(
+                    email=f"user{i}@example.com",
+                    name=f"User {i}",
+                    password="rubicon",
+                    member_since=date.today(),
+                )
+            )
+        db.session.commit()
+
+        @self.app.route("/users/<int:count>")
+        def get_users(count):
+            for id in range(1, count + 1):
+                # don't let the identity map answer without a query
+                db.session.remove()
+                User.query.get(id)
+            return "ok"
+
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_server_timing(self):
+        response = self.client.get("/users/2")
+        timing = response.headers["Server-Timing"]
+        self.assertTrue(timing.startswith("db;dur="))
+        self.assertTrue(timing.endswith('desc="2 queries"'))
+
+    def test_repeated_queries_logged(self):
+        with self.assertLogs(self.app.logger, "WARNING") as logs:
+            self.client.get("/users/3")
+        self.assertEqual(1, len(logs.output))
+        self.assertIn(
+            "possible N+1 in GET /users/3: 3 x SELECT", logs.output[0]
+        )
+
+    def test_slow_queries_logged(self):
+        self.app.config["LASTWEEK_SLOW_QUERY_MS"] = 0
+        with self.assertLogs(self.app.logger, "WARNING") as logs:
+            self.client.get("/users/1")
+        self.assertIn("slow query", logs.output[0])
+
+    def test_disabled(self):
+        client = create_app("testing").test_client()
+        self.assertNotIn("Server-Timing", client.get("/").headers)
@@ -0,0 +1,92 @@
+from datetime import date
+from base64 import b64encode
+import threading
+import unittest
+
+from app import create_app, db, metrics
+from app.models import User
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app.config["LASTWEEK_METRICS"] = True
+        metrics.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        user = User(
+            email="julius.caesar@example.com",
+            name="Julius Caesar",
+            password="rubicon",
+            confirmed=True,
+            member_since=date.today(),
+        )
+        db.session.add(user)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def scrape(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(200, response.status_code)
+        return response.get_data(as_text=True).splitlines()
+
+    def test_request_metrics(self):
+        key = b64encode(b"julius.caesar@example.com:rubicon").decode("utf-8")
+        headers = {"Authorization": f"Basic {key}"}
+        self.client.get("/api/weeks/", headers=headers)
+        self.client.get("/api/weeks/")
+        self.client.get("/nowhere")
+        lines = self.scrape()
+        self.assertIn(
+            'lastweek_http_requests_total{endpoint="api.get_weeks",'
+            'method="GET",status="200"} 1',
+            lines,
+        )
+        self.assertIn(
+            'lastweek_http_requests_total{endpoint="api.get_weeks",'
+            'method="GET",status="401"} 1',
+            lines,
+        )
+        self.assertIn(
+            'lastweek_http_requests_total{endpoint="unmatched",'
+            'method="GET",status="404"} 1',
+            lines,
+        )
+        self.assertIn(
+            "lastweek_http_request_duration_seconds_bucket{endpoint="
+            '"api.get_weeks",le="+Inf"} 2',
+            lines,
+        )
+        self.assertIn(
+            "lastweek_http_request_duration_seconds_count{endpoint="
+            '"api.get_weeks"} 2',
+            lines,
+        )
+        self.assertIn("lastweek_http_requests_in_flight 0", lines)
+
+    def test_threads_are_aggregated(self):
+        def get_index():
+            self.app.test_client().get("/")
+
+        threads = [threading.Thread(target=get_index) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # the threads have exited, so their shards were folded into one
+        self.assertEqual(1, len(self.app.extensions["metrics"].shards()))
+        self.assertIn(
+            'lastweek_http_requests_total{endpoint="main.index",'
+            'method="GET",status="200"} 4',
+            self.scrape(),
+        )
+
+    def test_disabled(self):
+        client = create_app("testing").test_client()
+        self.assertEqual(404, client.get("/metrics").status_code)
@@ -0,0 +1,34 @@
+import unittest
+
+from core.prefix_index import PrefixIndex
+
+
+class PrefixIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = PrefixIndex(
+            [("work", 3), ("Writing", 5), ("wrist", 1), ("walk", 3), ("x", 9)]
+        )
+
+    def test_complete(self):
+        self.assertListEqual(
+            [("Writing", 5), ("wrist", 1)], self.index.complete("wr", 10)
+        )
+
+    def test_complete_ignores_case(self):
+        self.assertListEqual([("Writing", 5)], self.index.complete("WRIT", 10))
+
+    def test_complete_heaviest_first(self):
+        self.assertListEqual(
+            [("Writing", 5), ("walk", 3)], self.index.complete("w", 2)
+        )
+
+    def test_complete_no_matches(self):
+        self.assertListEqual([], self.index.complete("y", 10))
+        self.assertListEqual([], self.index.complete("works", 10))
+
+    def test_complete_empty_prefix(self):
+        self.assertListEqual([("x", 9)], self.index.complete("", 1))
+
+    def test_len(self):
+        self.assertEqual(5, len(self.index))
+        self.assertEqual(0, len(PrefixIndex([])))
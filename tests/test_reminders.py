@@ -0,0 +1,100 @@
+from datetime import date, datetime
+from os import path
+import tempfile
+import unittest
+from unittest import mock
+
+from app import create_app, db, mail
+from app.models import OutboxMessage, Snippet, User
+from app import email
+from app.email import CLAIM_LEASE
+from reminders import send_reminders
+
+
+class RemindersTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.TemporaryDirectory()
+        self.app = create_app("testing")
+        # worker threads need to share the database
+        database = path.join(self.data_dir.name, "test.sqlite")
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + database
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        for i, confirmed in enumerate([True, True, False, True, True]):
+            db.session.add(
+                User(
+                    email=f"user{i}@example.com",
+                    name=f"User {i}",
+                    password="rubicon",
+                    confirmed=confirmed,
+                    member_since=date.today(),
+                )
+            )
+        db.session.commit()
+        Snippet.update(2, 2021, 16, "wrote", [])
+        Snippet.update(4, 2021, 15, "wrote last week", [])
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.get_engine(self.app).dispose()
+        self.app_context.pop()
+        self.data_dir.cleanup()
+
+    def test_missing_week(self):
+        users = User.missing_week(2021, 16).all()
+        self.assertListEqual([1, 4, 5], [user.id for user in users])
+
+    def test_send_reminders(self):
+        with mail.record_messages() as outbox:
+            sent = send_reminders(
+                db, (2021, 16), batch_size=2, workers=2, echo=lambda _: None
+            )
+        self.assertEqual(3, sent)
+        recipients = sorted(message.recipients[0] for message in outbox)
+        self.assertListEqual(
+            ["user0@example.com", "user3@example.com", "user4@example.com"],
+            recipients,
+        )
+        self.assertIn("week of 2021-04-19", outbox[0].body)
+        self.assertIn(
+            "http://lastweek-test.localdomain/edit/2021/16", outbox[0].html
+        )
+        self.assertEqual(
+            3,
+            OutboxMessage.query.filter(
+                OutboxMessage.sent_at.isnot(None)
+            ).count(),
+        )
+
+    def test_claimed_just_before_sending(self):
+        self.app.config["LASTWEEK_MAIL_BATCH_SIZE"] = 2
+        calls = []
+
+        def deliver(ids):
+            # nothing is queued, so nothing's lease runs, ahead of sending
+            queued = OutboxMessage.query.count()
+            leases = db.session.query(OutboxMessage.next_attempt_at).filter(
+                OutboxMessage.id.in_(ids)
+            )
+            calls.append((len(ids), queued, min(leases)[0]))
+            return email.deliver(ids)
+
+        start = datetime.utcnow()
+        with mock.patch("reminders.deliver", side_effect=deliver):
+            sent = send_reminders(
+                db, (2021, 16), batch_size=3, workers=1, echo=lambda _: None
+            )
+        self.assertEqual(3, sent)
+        self.assertListEqual([(2, 2), (1, 3)], [c[:2] for c in calls])
+        for (_, _, lease) in calls:
+            self.assertGreaterEqual(lease, start + CLAIM_LEASE)
+
+    def test_resume_after_id(self):
+        with mail.record_messages() as outbox:
+            sent = send_reminders(
+                db, (2021, 16), after_id=4, echo=lambda _: None
+            )
+        self.assertEqual(1, sent)
+        self.assertListEqual(["user4@example.com"], outbox[0].recipients)
@@ -0,0 +1,89 @@
+from base64 import b64encode
+from datetime import date, datetime
+from os import path
+import shutil
+import tempfile
+import unittest
+
+from app import create_app, db, replicas
+from app.models import Snippet, User
+
+
+class ReplicasTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.TemporaryDirectory()
+        primary = path.join(self.data_dir.name, "primary.sqlite")
+        replica = path.join(self.data_dir.name, "replica.sqlite")
+        self.app = create_app("testing")
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + primary
+        self.app.config["LASTWEEK_REPLICA_URIS"] = ["sqlite:///" + replica]
+        replicas.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        user = User(
+            email="julius.caesar@example.com",
+            name="Julius Caesar",
+            password="rubicon",
+            confirmed=True,
+            member_since=date.today(),
+        )
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+        Snippet.update(self.user_id, 2021, 1, "veni", [])
+        db.session.remove()
+        # the replica is a copy of the primary that falls behind it
+        shutil.copy(primary, replica)
+        Snippet.update(self.user_id, 2021, 1, "vidi", [])
+        # as if the write were older than the stickiness window
+        User.query.get(self.user_id).snippets_updated_at = datetime(2021, 1, 4)
+        db.session.commit()
+        key = b64encode(b"julius.caesar@example.com:rubicon").decode("utf-8")
+        self.headers = {"Authorization": f"Basic {key}"}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        for engine in (db.get_engine(), db.get_engine(bind="replica0")):
+            engine.dispose()
+        self.app_context.pop()
+        self.data_dir.cleanup()
+
+    def get_text(self, client):
+        resp = client.get("/api/weeks/2021/1", headers=self.headers)
+        self.assertEqual(200, resp.status_code)
+        return resp.json["text"]
+
+    def test_reads_from_replica(self):
+        resp = self.app.test_client().get(
+            "/api/weeks/2021/1", headers=self.headers
+        )
+        self.assertEqual("veni", resp.json["text"])
+        self.assertNotIn("Set-Cookie", resp.headers)
+
+    def test_reads_outside_requests_from_primary(self):
+        self.assertEqual(
+            "vidi", Snippet.get_by_week(self.user_id, 2021, 1).text
+        )
+
+    def test_writes_go_to_primary(self):
+        client = self.app.test_client()
+        resp = client.post(
+            "/api/weeks/2021/1", headers=self.headers, json={"text": "vici"}
+        )
+        self.assertEqual(200, resp.status_code)
+        self.assertIn(replicas.STICKY_COOKIE, resp.headers["Set-Cookie"])
+        db.session.remove()
+        self.assertEqual(
+            "vici", Snippet.get_by_week(self.user_id, 2021, 1).text
+        )
+        self.assertEqual("vici", self.get_text(client))
+
+    def test_writes_are_read_without_cookies(self):
+        client = self.app.test_client(use_cookies=False)
+        resp = client.put(
+            "/api/weeks/2021/1", headers=self.headers, json={"text": "vici"}
+        )
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual("vici", self.get_text(client))
@@ -0,0 +1,113 @@
+from datetime import date
+import unittest
+
+from app import create_app, db
+from app.models import Snippet, User
+from app.search import highlight_html, rebuild_index, search
+
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        for name in ("Julius Caesar", "Mark Antony"):
+            db.session.add(
+                User(
+                    email=f"{name.split()[0].lower()}@example.com",
+                    name=name,
+                    password="rubicon",
+                    confirmed=True,
+                    member_since=date.today(),
+                )
+            )
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def weeks(self, user_id, text):
+        return [snippet.week for (snippet, _, _) in search(user_id, text)]
+
+    def test_search_is_per_user(self):
+        Snippet.update(1, 2021, 1, "crossed the Rubicon", [])
+        Snippet.update(2, 2021, 1, "crossed the Rubicon too", [])
+        self.assertListEqual([1], self.weeks(1, "rubicon"))
+        self.assertListEqual([], self.weeks(1, "too"))
+
+    def test_search_matches_every_word_and_stems(self):
+        Snippet.update(1, 2021, 1, "crossing rivers", [])
+        Snippet.update(1, 2021, 2, "crossed the Rubicon", [])
+        self.assertListEqual([1, 2], sorted(self.weeks(1, "cross")))
+        self.assertListEqual([2], self.weeks(1, "cross rubicon"))
+
+    def test_index_follows_updates(self):
+        Snippet.update(1, 2021, 1, "came", [])
+        Snippet.update(1, 2021, 1, "saw", [])
+        Snippet.update_many(1, [{"year": 2021, "week": 2, "text": "saw"}])
+        self.assertListEqual([], self.weeks(1, "came"))
+        self.assertListEqual(
+            [2, 1], sorted(self.weeks(1, "saw"), reverse=True)
+        )
+
+    def test_search_syntax_is_ignored(self):
+        Snippet.update(1, 2021, 1, "veni vidi vici", [])
+        self.assertListEqual([1], self.weeks(1, 'vidi* -(vici"'))
+        self.assertIsNone(search(1, '"*" - ()'))
+
+    def test_highlight_html(self):
+        Snippet.update(1, 2021, 1, "<b>alea</b> iacta est", [])
+        ((_, _, highlight),) = search(1, "alea")
+        self.assertEqual(
+            "&lt;b&gt;<mark>alea</mark>&lt;/b&gt; iacta est",
+            highlight_html(highlight),
+        )
+
+    def test_rebuild_index(self):
+        Snippet.update(1, 2021, 1, "veni vidi vici", [])
+        rebuild_index()
+        self.assertListEqual([1], self.weeks(1, "vici"))
+
+
+class SearchViewTest(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        user = User(
+            email="julius.caesar@example.com",
+            name="Julius Caesar",
+            password="rubicon",
+            confirmed=True,
+            member_since=date.today(),
+        )
+        db.session.add(user)
+        db.session.commit()
+        Snippet.update(user.id, 2021, 1, "crossed the Rubicon", ["war"])
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as session:
+            session["_user_id"] = str(user.id)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_search_view(self):
+        resp = self.client.get("/search?q=rubicon")
+        self.assertEqual(200, resp.status_code)
+        html = resp.get_data(as_text=True)
+        self.assertIn("crossed the <mark>Rubicon</mark>", html)
+        self.assertIn("war", html)
+
+    def test_search_view_without_results(self):
+        resp = self.client.get("/search?q=gaul")
+        self.assertIn(
+            "No weeks match your search.", resp.get_data(as_text=True)
+        )
+        resp = self.client.get("/search")
+        self.assertEqual(200, resp.status_code)
@@ -2,7 +2,9 @@ from core.date_utils import iso_week_begin
 import datetime
 import unittest
 
-from app.models import Snippet, Tag, User
+from sqlalchemy.exc import IntegrityError
+
+from app.models import Snippet, Tag, User, VersionConflict
 from app import create_app, db
 
 
@@ -62,6 +64,19 @@ class SnippetModelTest(unittest.TestCase):
         self.assertIsNotNone(found)
         self.assertEqual(self.snippets[0].id, found.id)
 
+    def test_one_snippet_per_week(self):
+        snippet = self.snippets[0]
+        db.session.add(
+            Snippet(
+                user_id=snippet.user_id,
+                text="baz",
+                year=snippet.year,
+                week=snippet.week,
+            )
+        )
+        with self.assertRaises(IntegrityError):
+            db.session.commit()
+
     def test_get_all_no_such_user(self):
         user_id = self.user.id + 1
         self.assertListEqual([], Snippet.get_all(user_id).all())
@@ -130,6 +145,67 @@ class SnippetModelTest(unittest.TestCase):
             {"senate", "prophecy"}, {tag.text for tag in found.tags}
         )
 
+    def test_update_week_twice(self):
+        first = Snippet.update(self.user.id, 2020, 5, "foo", ["red"])
+        second = Snippet.update(self.user.id, 2020, 5, "bar", ["green"])
+        self.assertEqual(first.id, second.id)
+        found = Snippet.query.filter_by(year=2020, week=5).all()
+        self.assertEqual(1, len(found))
+        self.assertEqual("bar", found[0].text)
+        self.assertSetEqual({"green"}, {tag.text for tag in found[0].tags})
+
+    def test_update_increments_version(self):
+        snippet = Snippet.update(self.user.id, 2020, 5, "foo", [])
+        self.assertEqual(1, snippet.version)
+        snippet = Snippet.update(self.user.id, 2020, 5, "bar", [])
+        self.assertEqual(2, snippet.version)
+
+    def test_update_if_versions(self):
+        snippet = self.snippets[1]
+        (year, week) = (snippet.year, snippet.week)
+        with self.assertRaises(VersionConflict):
+            Snippet.update(self.user.id, year, week, "baz", [], {0, 2})
+        self.assertEqual("bar", Snippet.query.get(snippet.id).text)
+        Snippet.update(self.user.id, year, week, "baz", [], {1})
+        self.assertEqual("baz", Snippet.query.get(snippet.id).text)
+
+    def test_update_many(self):
+        weeks = [
+            {"year": 2020, "week": 5, "text": "foo", "tags": ["red", "blue"]},
+            {"year": 2012, "week": 9, "text": "baz", "tags": ["blue"]},
+            {"year": 2020, "week": 5, "text": "qux", "tags": ["red"]},
+        ]
+        written = Snippet.update_many(self.user.id, weeks)
+        self.assertEqual(2, len(written))
+        created = Snippet.get_by_week(self.user.id, 2020, 5)
+        self.assertEqual("qux", created.text)
+        self.assertSetEqual({"red"}, {tag.text for tag in created.tags})
+        updated = Snippet.query.get(self.snippets[1].id)
+        self.assertEqual("baz", updated.text)
+        self.assertEqual(2, updated.version)
+        self.assertSetEqual({"blue"}, {tag.text for tag in updated.tags})
+
+    def test_get_state_follows_writes(self):
+        (etag, updated_at) = Snippet.get_state(self.user.id)
+        snippet = Snippet.update(self.user.id, 2020, 5, "foo", [])
+        (after, after_updated_at) = Snippet.get_state(self.user.id)
+        self.assertNotEqual(etag, after)
+        self.assertEqual(snippet.updated_at, after_updated_at)
+        Snippet.update_many(self.user.id, [{"year": 2020, "week": 6}])
+        self.assertNotEqual(after, Snippet.get_state(self.user.id)[0])
+
+    def test_update_renders_html(self):
+        snippet = Snippet.update(self.user.id, 2020, 5, "*foo*", [])
+        self.assertEqual("<p><em>foo</em></p>", snippet.html)
+        snippet = Snippet.update(self.user.id, 2020, 5, "**bar**", [])
+        self.assertEqual("<p><strong>bar</strong></p>", snippet.html)
+
+    def test_to_html(self):
+        snippet = self.snippets[0]
+        self.assertEqual("<p>foo</p>", snippet.to_html())
+        snippet.text = "_baz_"
+        self.assertEqual("<p><em>baz</em></p>", snippet.to_html())
+
     def test_to_json(self):
         snippet = self.snippets[0]
         json = snippet.to_json()
@@ -140,6 +216,18 @@ class SnippetModelTest(unittest.TestCase):
             {tag.text for tag in snippet.tags}, set(json["tags"])
         )
 
+    def test_to_json_all(self):
+        found = Snippet.to_json_all(self.snippets)
+        self.assertListEqual(
+            [snippet.to_json() for snippet in self.snippets], found
+        )
+
+    def test_get_tags(self):
+        tags = Snippet.get_tags(self.snippets)
+        self.assertDictEqual(
+            {self.snippets[0].id: ["blue"], self.snippets[1].id: []}, tags
+        )
+
     def test_from_json_new(self):
         date = iso_week_begin(datetime.date(44, 3, 15))
         (yr, wk, _) = date.isocalendar()
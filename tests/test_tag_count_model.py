@@ -0,0 +1,147 @@
+from datetime import date
+import unittest
+
+from app import create_app, db
+from app.models import Snippet, Tag, TagCount, User
+
+
+class TagCountModelTest(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        for name in ("Julius Caesar", "Mark Antony"):
+            db.session.add(
+                User(
+                    email=f"{name.split()[0].lower()}@example.com",
+                    name=name,
+                    password="rubicon",
+                    confirmed=True,
+                    member_since=date.today(),
+                )
+            )
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_update_counts_tags(self):
+        Snippet.update(1, 2021, 1, "veni", ["gaul", "war"])
+        Snippet.update(1, 2021, 2, "vidi", ["war"])
+        Snippet.update(2, 2021, 1, "vici", ["egypt"])
+        self.assertListEqual([("war", 2), ("gaul", 1)], TagCount.get_all(1))
+        self.assertListEqual([("egypt", 1)], TagCount.get_all(2))
+
+    def test_update_retags(self):
+        Snippet.update(1, 2021, 1, "veni", ["gaul", "war"])
+        Snippet.update(1, 2021, 2, "vidi", ["war"])
+        Snippet.update(1, 2021, 1, "veni", ["war", "rome"])
+        self.assertListEqual([("war", 2), ("rome", 1)], TagCount.get_all(1))
+        Snippet.update(1, 2021, 2, "vidi", [])
+        Snippet.update(1, 2021, 1, "veni", [])
+        self.assertListEqual([], TagCount.get_all(1))
+        self.assertEqual(0, TagCount.query.count())
+
+    def test_update_many_counts_tags(self):
+        weeks = [
+            {"year": 2021, "week": 1, "text": "veni", "tags": ["gaul"]},
+            {"year": 2021, "week": 2, "text": "vidi", "tags": ["gaul"]},
+            {"year": 2021, "week": 1, "text": "vici", "tags": ["war"]},
+        ]
+        Snippet.update_many(1, weeks)
+        self.assertListEqual([("gaul", 1), ("war", 1)], TagCount.get_all(1))
+
+    def test_rebuild(self):
+        Snippet.update(1, 2021, 1, "veni", ["gaul", "war"])
+        Snippet.update(2, 2021, 1, "vici", ["war"])
+        TagCount.query.delete()
+        TagCount.add({(1, 1): 5})
+        db.session.commit()
+        TagCount.rebuild()
+        self.assertListEqual([("gaul", 1), ("war", 1)], TagCount.get_all(1))
+        self.assertListEqual([("war", 1)], TagCount.get_all(2))
+
+    def test_blank_tags_are_ignored(self):
+        Snippet.update(1, 2021, 1, "veni", ["", " ", "gaul"])
+        Snippet.update_many(
+            1, [{"year": 2021, "week": 2, "text": "vidi", "tags": [""]}]
+        )
+        self.assertListEqual([("gaul", 1)], TagCount.get_all(1))
+        self.assertIsNone(Tag.query.filter_by(text="").first())
+
+    def test_edit_without_tags(self):
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session["_user_id"] = "1"
+        resp = client.post("/edit/2021/3", data={"text": "vici", "tags": ""})
+        self.assertEqual(302, resp.status_code)
+        self.assertEqual("vici", Snippet.get_by_week(1, 2021, 3).text)
+        self.assertListEqual([], TagCount.get_all(1))
+        self.assertListEqual(
+            [], client.get("/tags/complete?prefix=").json["tags"]
+        )
+
+    def test_complete(self):
+        Snippet.update(1, 2021, 1, "veni", ["Gaul", "war", "gallia"])
+        Snippet.update(1, 2021, 2, "vidi", ["gallia"])
+        self.assertListEqual(
+            [("gallia", 2), ("Gaul", 1)], TagCount.complete(1, "ga", 10)
+        )
+        self.assertListEqual([("gallia", 2)], TagCount.complete(1, "G", 1))
+        self.assertListEqual([], TagCount.complete(2, "ga", 10))
+
+    def test_complete_after_update(self):
+        Snippet.update(1, 2021, 1, "veni", ["gaul"])
+        self.assertListEqual([("gaul", 1)], TagCount.complete(1, "g", 10))
+        Snippet.update(1, 2021, 1, "veni", ["germania"])
+        self.assertListEqual([("germania", 1)], TagCount.complete(1, "g", 10))
+
+    def test_cache_is_evicted_after_commit(self):
+        Snippet.update(1, 2021, 1, "veni", ["gaul"])
+        cache = self.app.extensions["tag_cache"]
+        TagCount.complete(1, "g", 10)
+        TagCount.add({(1, 1): 1})
+        self.assertIsNotNone(cache.get(1))
+        db.session.commit()
+        self.assertIsNone(cache.get(1))
+        TagCount.complete(1, "g", 10)
+        TagCount.add({(1, 1): 1})
+        db.session.rollback()
+        self.assertIsNone(cache.get(1))
+        self.assertListEqual([("gaul", 2)], TagCount.complete(1, "g", 10))
+
+    def test_complete_without_cache(self):
+        self.app.config["LASTWEEK_TAG_CACHE_MAX_TAGS"] = 1
+        Snippet.update(1, 2021, 1, "veni", ["Gaul", "war", "gallia"])
+        Snippet.update(1, 2021, 2, "vidi", ["gallia", "g_l"])
+        self.assertListEqual(
+            [("gallia", 2), ("Gaul", 1)], TagCount.complete(1, "ga", 10)
+        )
+        self.assertListEqual([("g_l", 1)], TagCount.complete(1, "g_", 10))
+        self.assertIs(False, self.app.extensions["tag_cache"].get(1))
+
+    def test_history_sidebar(self):
+        Snippet.update(1, 2021, 1, "veni", ["gaul", "war"])
+        Snippet.update(1, 2021, 2, "vidi", ["war"])
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session["_user_id"] = "1"
+        html = client.get("/history?tag=war").get_data(as_text=True)
+        self.assertIn('<span class="badge">2</span>', html)
+        self.assertIn('href="/history?tag=gaul"', html)
+        self.app.config["LASTWEEK_SIDEBAR_TAGS"] = 1
+        html = client.get("/history").get_data(as_text=True)
+        self.assertIn('<span class="badge">2</span>', html)
+        self.assertNotIn('<span class="badge">1</span>', html)
+
+    def test_complete_view(self):
+        Snippet.update(1, 2021, 1, "veni", ["gaul", "war"])
+        client = self.app.test_client()
+        self.assertEqual(302, client.get("/tags/complete").status_code)
+        with client.session_transaction() as session:
+            session["_user_id"] = "1"
+        resp = client.get("/tags/complete?prefix=w")
+        self.assertListEqual([{"text": "war", "count": 1}], resp.json["tags"])
@@ -36,4 +36,16 @@ class TagModelTest(unittest.TestCase):
     def test_get_all_eliminates_duplicates(self):
         tags = Tag.get_all(["foo", "foo"])
         self.assertEqual(1, len(tags))
-        self.assertEqual(1, Tag.query.filter_by(text="foo").count())
\ No newline at end of file
+        self.assertEqual(1, Tag.query.filter_by(text="foo").count())
+
+    def test_get_all_mixed_existing_and_new(self):
+        tag = Tag(text="foo")
+        db.session.add(tag)
+        db.session.commit()
+        tags = Tag.get_all(["foo", "bar", "baz"])
+        self.assertSetEqual({"foo", "bar", "baz"}, {t.text for t in tags})
+        self.assertIn(tag.id, {t.id for t in tags})
+        self.assertEqual(3, Tag.query.count())
+
+    def test_get_all_empty(self):
+        self.assertListEqual([], Tag.get_all([]))
@@ -0,0 +1,54 @@
+from time import sleep
+import unittest
+
+from core.ttl_cache import TTLCache
+
+
+class TTLCacheTest(unittest.TestCase):
+    def test_get_missing(self):
+        cache = TTLCache(2, 60)
+        self.assertIsNone(cache.get("foo"))
+        self.assertEqual("bar", cache.get("foo", "bar"))
+        self.assertEqual(2, cache.misses)
+
+    def test_set_and_get(self):
+        cache = TTLCache(2, 60)
+        cache.set("foo", 1)
+        self.assertEqual(1, cache.get("foo"))
+        self.assertEqual(1, cache.hits)
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(2, 60)
+        cache.set("foo", 1)
+        cache.set("bar", 2)
+        cache.get("foo")
+        cache.set("baz", 3)
+        self.assertIsNone(cache.get("bar"))
+        self.assertEqual(1, cache.get("foo"))
+        self.assertEqual(3, cache.get("baz"))
+        self.assertEqual(1, cache.evictions)
+
+    def test_entries_expire(self):
+        cache = TTLCache(2, 60)
+        cache.set("foo", 1, ttl=0.01)
+        sleep(0.02)
+        self.assertIsNone(cache.get("foo"))
+        self.assertEqual(1, cache.evictions)
+        self.assertEqual(0, len(cache))
+
+    def test_ttl_is_bounded_by_cache_ttl(self):
+        cache = TTLCache(2, 0.01)
+        cache.set("foo", 1, ttl=60)
+        sleep(0.02)
+        self.assertIsNone(cache.get("foo"))
+
+    def test_disabled(self):
+        cache = TTLCache(0, 60)
+        cache.set("foo", 1)
+        self.assertIsNone(cache.get("foo"))
+
+    def test_pop(self):
+        cache = TTLCache(2, 60)
+        cache.set("foo", 1)
+        self.assertEqual(1, cache.pop("foo"))
+        self.assertIsNone(cache.get("foo"))
@@ -4,6 +4,7 @@ import unittest
 
 from app import create_app, db
 from app.models import User
+from core.ttl_cache import TTLCache
 
 
 class UserModelTest(unittest.TestCase):
@@ -88,5 +89,75 @@ class UserModelTest(unittest.TestCase):
         self.assertFalse(u.confirm(token))
         self.assertFalse(u.confirmed)
 
+    def test_auth_token(self):
+        u = User(
+            name="bob",
+            email="bob@example.com",
+            password="cat",
+            confirmed=True,
+            member_since=date.today(),
+        )
+        db.session.add(u)
+        db.session.commit()
+        token = u.generate_auth_token(3600)
+        self.assertEqual(u.id, User.verify_auth_token(token).id)
+        self.assertIsNone(User.verify_auth_token(token + "x"))
+
+    def test_auth_token_cached(self):
+        u = User(
+            name="bob",
+            email="bob@example.com",
+            password="cat",
+            confirmed=True,
+            member_since=date.today(),
+        )
+        db.session.add(u)
+        db.session.commit()
+        token = u.generate_auth_token(3600)
+        cache = self.app.extensions["token_cache"]
+        User.verify_auth_token(token)
+        self.assertEqual(1, cache.misses)
+        db.session.remove()
+        found = User.verify_auth_token(token)
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(u.id, found.id)
+        self.assertEqual("bob@example.com", found.email)
+
+    def test_password_verification_cached(self):
+        cache = TTLCache(10, 60)
+        self.app.extensions["credential_cache"] = cache
+        u = User(
+            name="bob",
+            email="bob@example.com",
+            password="cat",
+            confirmed=True,
+            member_since=date.today(),
+        )
+        db.session.add(u)
+        db.session.commit()
+        self.assertFalse(u.verify_password_cached("dog"))
+        self.assertTrue(u.verify_password_cached("cat"))
+        self.assertTrue(u.verify_password_cached("cat"))
+        self.assertEqual(1, cache.hits)
+        self.assertFalse(u.verify_password_cached("dog"))
+
+    def test_password_change_clears_cached_password(self):
+        cache = TTLCache(10, 60)
+        self.app.extensions["credential_cache"] = cache
+        u = User(
+            name="bob",
+            email="bob@example.com",
+            password="cat",
+            confirmed=True,
+            member_since=date.today(),
+        )
+        db.session.add(u)
+        db.session.commit()
+        self.assertTrue(u.verify_password_cached("cat"))
+        u.password = "dog"
+        self.assertEqual(0, len(cache))
+        self.assertFalse(u.verify_password_cached("cat"))
+        self.assertTrue(u.verify_password_cached("dog"))
+
     # TODO: test reset
     # TODO: test auth
\ No newline at end of file